@@ -0,0 +1,150 @@
+"""
+Sprite loading for the UI
+Scaled variants of the images are built once and kept in an on-disk cache,
+so later starts only decode the small sprites that are actually drawn
+"""
+import os
+import json
+import hashlib
+import tkinter as tk
+from collections.abc import Mapping
+
+import Constants
+
+INDEX_FILE = "index.json"  # source path -> [size, mtime in ns, hash] of the sources hashed so far
+
+
+class SpriteCache:
+    """
+    Loads images scaled down by an integer subsample factor, lazily on first use.
+    Scaled variants are stored as png in the cache directory under a name containing
+    a hash of the source file and the factor, so a changed source image is rebuilt automatically.
+    The hashes are kept in an index together with size and modification time of the sources,
+    so a start with unchanged images only reads the small cached variants.
+    """
+    def __init__(self, cache_dir=Constants.SPRITE_CACHE_DIR):
+        """
+        Constructor
+        Requires an existing tk root window before the first sprite is loaded
+        :param cache_dir: str or None - directory of the scaled variants, None disables the disk cache
+        """
+        self.cache_dir = cache_dir
+        self.sprites: dict[tuple[str, int], tk.PhotoImage] = {}
+        self.index: dict[str, list] | None = None  # read from the cache directory on first use
+
+    def get(self, path, subsample=1):
+        """
+        Returns the image at the given path scaled down by the factor
+        :param path: str - path of the source image
+        :param subsample: int - keep every n-th pixel in both directions
+        :return: PhotoImage
+        """
+        key = (path, subsample)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.sprites[key] = self.load(path, subsample)
+        return sprite
+
+    def cache_path(self, path, subsample):
+        """
+        Path of the cached variant of a source image
+        :return: str
+        """
+        source_hash = self.source_hash(path)
+        name = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.cache_dir, f"{name}-{source_hash}-x{subsample}.png")
+
+    def source_hash(self, path):
+        """
+        Hash of a source image, only computed if size or modification time differ from the index
+        :param path: str - path of the source image
+        :return: str
+        """
+        if self.index is None:
+            try:
+                with open(os.path.join(self.cache_dir, INDEX_FILE), "r") as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError):
+                self.index = {}
+        stat = os.stat(path)
+        entry = self.index.get(path)
+        if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2]
+
+        with open(path, "rb") as source:
+            source_hash = hashlib.sha1(source.read()).hexdigest()[:16]
+        self.index[path] = [stat.st_size, stat.st_mtime_ns, source_hash]
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = os.path.join(self.cache_dir, f"{INDEX_FILE}.{os.getpid()}.tmp")
+            with open(temp_path, "w") as f:
+                json.dump(self.index, f)
+            os.replace(temp_path, os.path.join(self.cache_dir, INDEX_FILE))
+        except OSError:
+            pass  # hashed again on the next start
+        return source_hash
+
+    def load(self, path, subsample):
+        """
+        Reads a scaled variant from the disk cache, or builds it from the source image and stores it
+        :return: PhotoImage
+        """
+        if self.cache_dir is None:
+            return self.scale(path, subsample)
+
+        cached = self.cache_path(path, subsample)
+        if os.path.exists(cached):
+            try:
+                return tk.PhotoImage(file=cached)
+            except tk.TclError:
+                pass  # damaged cache file, rebuild it
+
+        sprite = self.scale(path, subsample)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{cached}.{os.getpid()}.tmp"
+            sprite.write(temp_path, format="png")
+            os.replace(temp_path, cached)
+        except (OSError, tk.TclError):
+            pass  # the cache is only an optimization, keep the sprite in memory
+        return sprite
+
+    @staticmethod
+    def scale(path, subsample):
+        """
+        Decodes the full size source image and scales it down
+        :return: PhotoImage
+        """
+        image = tk.PhotoImage(file=path)
+        return image.subsample(subsample) if subsample > 1 else image
+
+
+class SpriteSet(Mapping):
+    """
+    Read-only mapping of keys (e.g. cargo types or line colors) to sprites of the same scale,
+    each sprite is loaded when it is first looked up
+    """
+    def __init__(self, cache, paths, subsample, fallback_path=None):
+        """
+        Constructor
+        :param cache: SpriteCache - cache loading the sprites
+        :param paths: dict - key -> source image path
+        :param subsample: int - scale factor shared by all sprites
+        :param fallback_path: str or None - image used for keys without an own path
+        """
+        self.cache = cache
+        self.paths = paths
+        self.subsample = subsample
+        self.fallback_path = fallback_path
+
+    def __getitem__(self, key):
+        path = self.paths.get(key, self.fallback_path)
+        if path is None:
+            raise KeyError(key)
+        return self.cache.get(path, self.subsample)
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
@@ -0,0 +1,196 @@
+"""
+Audio service playing the sound effects of the main game
+Sounds are decoded once into memory and played by a small pool of worker threads,
+so the game thread only queues a clip and never waits for the disk or the audio device.
+The game itself does not know about audio, the service listens to its events.
+"""
+import queue
+import threading
+import wave
+
+import Constants
+
+# game event -> name of the clip played for it
+EVENT_SOUNDS = {
+    "train_bought": "choo_choo",
+}
+# clip name -> wav file
+SOUND_FILES = {
+    "choo_choo": Constants.CHOO_CHOO_SOUND,
+}
+
+
+class Clip:
+    """
+    Decoded sound held in memory
+    """
+    def __init__(self, wav_bytes, frames, channels, sample_width, frame_rate):
+        """
+        Constructor
+        :param wav_bytes: bytes - complete wav file, for backends playing wav images
+        :param frames: bytes - raw pcm samples
+        :param channels: int
+        :param sample_width: int - bytes per sample
+        :param frame_rate: int - frames per second
+        """
+        self.wav_bytes = wav_bytes
+        self.frames = frames
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_rate = frame_rate
+
+
+def load_clip(path):
+    """
+    Reads and decodes a pcm wav file
+    :param path: str - path of the wav file
+    :return: Clip
+    """
+    with open(path, "rb") as f:
+        wav_bytes = f.read()
+    with wave.open(path, "rb") as wav:
+        return Clip(wav_bytes, wav.readframes(wav.getnframes()),
+                    wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+
+
+class NullBackend:
+    """
+    Backend that swallows every sound, used for headless runs and platforms without a sound library
+    """
+    voices = 1
+
+    def play(self, clip):
+        """
+        Ignores the clip
+        :param clip: Clip
+        :return: None
+        """
+        pass
+
+
+class WinsoundBackend:
+    """
+    Backend playing wav images from memory through the windows winsound module.
+    winsound plays one sound at a time, so a single voice is used.
+    """
+    voices = 1
+
+    def __init__(self):
+        """
+        Constructor
+        Raises ImportError when winsound is not available on this platform
+        """
+        import winsound
+        self.winsound = winsound
+
+    def play(self, clip):
+        """
+        Plays the clip, blocks the calling worker until it is finished
+        :param clip: Clip
+        :return: None
+        """
+        self.winsound.PlaySound(clip.wav_bytes, self.winsound.SND_MEMORY)
+
+
+class SimpleaudioBackend:
+    """
+    Cross-platform backend using the optional simpleaudio package, mixes up to AUDIO_VOICES clips
+    """
+    voices = Constants.AUDIO_VOICES
+
+    def __init__(self):
+        """
+        Constructor
+        Raises ImportError when simpleaudio is not installed
+        """
+        import simpleaudio
+        self.simpleaudio = simpleaudio
+
+    def play(self, clip):
+        """
+        Plays the clip, blocks the calling worker until it is finished
+        :param clip: Clip
+        :return: None
+        """
+        self.simpleaudio.play_buffer(clip.frames, clip.channels, clip.sample_width, clip.frame_rate).wait_done()
+
+
+class AudioService:
+    """
+    Plays preloaded clips on a pool of worker threads, one clip per worker at a time.
+    Requests are dropped when more clips are waiting than the queue holds, instead of delaying the caller.
+    """
+    def __init__(self, backend=None, sound_files=SOUND_FILES):
+        """
+        Constructor
+        Decodes all sound files and starts the workers
+        :param backend: backend with a blocking play(clip) method and a voices attribute, silent when None
+        :param sound_files: dict[str, str] - clip name -> wav file
+        """
+        self.backend = backend if backend is not None else NullBackend()
+        self.clips = {name: load_clip(path) for name, path in sound_files.items()}
+        self.requests = queue.Queue(maxsize=Constants.AUDIO_QUEUE_SIZE)
+        self.workers = []
+        for _ in range(self.backend.voices):
+            worker = threading.Thread(target=self.work, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def play(self, name):
+        """
+        Queues the clip to be played, never blocks
+        :param name: str - name of a loaded clip
+        :return: bool - False if the clip was dropped because too many are waiting
+        """
+        try:
+            self.requests.put_nowait(self.clips[name])
+            return True
+        except queue.Full:
+            return False
+
+    def on_event(self, event, data):
+        """
+        Game listener, plays the sound belonging to the event if there is one
+        :param event: str - name of the game event
+        :param data: dict - event details
+        :return: None
+        """
+        name = EVENT_SOUNDS.get(event)
+        if name is not None:
+            self.play(name)
+
+    def work(self):
+        """
+        Worker thread, plays queued clips until a None request arrives
+        :return: None
+        """
+        while True:
+            clip = self.requests.get()
+            if clip is None:
+                return
+            try:
+                self.backend.play(clip)
+            except Exception as ex:
+                print(ex)  # a broken audio device must not take down the worker
+
+    def close(self):
+        """
+        Stops all workers after the clips currently playing
+        :return: None
+        """
+        for _ in self.workers:
+            self.requests.put(None)
+        self.workers.clear()
+
+
+def create_audio():
+    """
+    Creates an audio service with the best backend available on this platform
+    :return: AudioService
+    """
+    for backend in (WinsoundBackend, SimpleaudioBackend):
+        try:
+            return AudioService(backend())
+        except ImportError:
+            pass
+    return AudioService(NullBackend())
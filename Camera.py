@@ -0,0 +1,90 @@
+import Constants
+
+
+class Camera:
+    """
+    Zoom and pan of the playing field view.
+    Converts between world coordinates used by the game model and screen coordinates on the canvas,
+    the version counter is incremented on every change so the renderer knows when to reposition its items.
+    """
+    def __init__(self, width=Constants.UI_WIDTH - Constants.UI_SIDEBAR_MARGIN, height=Constants.UI_HEIGHT):
+        """
+        Constructor
+        :param width: int - width of the canvas in pixels
+        :param height: int - height of the canvas in pixels
+        """
+        self.width = width
+        self.height = height
+        self.zoom = 1.0
+        self.offset_x = 0.0  # world position shown in the top left corner
+        self.offset_y = 0.0
+        self.version = 0
+
+    def to_screen(self, x, y):
+        """
+        Converts a world position into canvas coordinates
+        :return: tuple[float, float]
+        """
+        return (x - self.offset_x) * self.zoom, (y - self.offset_y) * self.zoom
+
+    def to_world(self, x, y):
+        """
+        Converts canvas coordinates, e.g. of a mouse event, into a world position
+        :return: tuple[float, float]
+        """
+        return x / self.zoom + self.offset_x, y / self.zoom + self.offset_y
+
+    def visible_rect(self, margin=0):
+        """
+        World rectangle currently shown on the canvas
+        :param margin: float - screen pixels added on every side, for items drawn next to their entity
+        :return: tuple - x1, y1, x2, y2
+        """
+        x1, y1 = self.to_world(-margin, -margin)
+        x2, y2 = self.to_world(self.width + margin, self.height + margin)
+        return x1, y1, x2, y2
+
+    def is_detailed(self):
+        """
+        Checks if the view is zoomed in far enough to draw every single cargo and train sprite
+        :return: bool
+        """
+        return self.zoom >= Constants.CAMERA_LOD_ZOOM
+
+    def resize(self, width, height):
+        """
+        Called when the canvas changed its size
+        :return: None
+        """
+        if (width, height) != (self.width, self.height):
+            self.width = width
+            self.height = height
+            self.version += 1
+
+    def pan(self, dx, dy):
+        """
+        Moves the view by the given canvas distance
+        :param dx: float - screen pixels
+        :param dy: float - screen pixels
+        :return: None
+        """
+        self.offset_x -= dx / self.zoom
+        self.offset_y -= dy / self.zoom
+        self.version += 1
+
+    def zoom_at(self, x, y, factor):
+        """
+        Zooms by the given factor while keeping the world position under the canvas coordinates in place
+        :param x: float - canvas x position, usually the cursor
+        :param y: float - canvas y position
+        :param factor: float - >1 zooms in, <1 zooms out
+        :return: None
+        """
+        zoom = min(max(self.zoom * factor, Constants.CAMERA_MIN_ZOOM), Constants.CAMERA_MAX_ZOOM)
+        if zoom == self.zoom:
+            return
+        world_x, world_y = self.to_world(x, y)
+        self.zoom = zoom
+        self.offset_x = world_x - x / zoom
+        self.offset_y = world_y - y / zoom
+        self.version += 1
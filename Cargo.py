@@ -5,22 +5,110 @@ class Cargo:
     Represents a cargo element which will be created by the main game at a random station
     Cam either be attached to a station or train and delivers a losing condition when it times out
     """
-    def __init__(self, cargo_type, start_station, loss_callback, disable_callback):
+    __slots__ = ("cargo_type", "owner", "spawn_tick", "expiry_tick", "registry", "handle")
+
+    def __init__(self, cargo_type, start_station, spawn_tick):
         """
         Constructor
         :param cargo_type: int - type of this cargo
         :param start_station: Station - first owner object to define position
+        :param spawn_tick: int - tick counter of the main game when this cargo is created
         """
         self.cargo_type = cargo_type
         self.owner = start_station
-        self.elimination_timer = Constants.ELIMINATION_TIMER
-        self.trigger_loss = loss_callback
-        self.unlist = lambda: disable_callback(self)
+        self.spawn_tick = spawn_tick
+        self.expiry_tick = spawn_tick + Constants.ELIMINATION_TIMER
+        self.registry = None
+        self.handle = None
+
+    @property
+    def delivered(self):
+        """
+        True once the cargo was removed from its registry
+        """
+        return self.handle is None
 
     def hop_on_train(self, train):
         self.owner = train
 
-    def tick(self):
-        self.elimination_timer -= 1
-        if self.elimination_timer <= 0:
-            self.trigger_loss()
\ No newline at end of file
+    def unlist(self):
+        """
+        Removes this cargo from the registry of the main game when it is delivered
+        :return: None
+        """
+        self.registry.remove(self)
+
+    def ticks_left(self, tick_counter):
+        """
+        Number of ticks until this cargo times out and the game is lost
+        :param tick_counter: int - current tick counter of the main game
+        :return: int
+        """
+        return self.expiry_tick - tick_counter
+
+
+class CargoRegistry:
+    """
+    Keeps track of all live cargo of the main game.
+    Cargo is keyed by an increasing id handle, so insert and delete are O(1)
+    and iteration follows the spawn order.
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.cargos: dict[int, 'Cargo'] = {}
+        self.next_handle = 0
+
+    def add(self, cargo):
+        """
+        Registers a cargo element and hands it its handle
+        :param cargo: Cargo - newly spawned cargo
+        :return: int - handle of the cargo
+        """
+        handle = self.next_handle
+        self.next_handle += 1
+        self.cargos[handle] = cargo
+        cargo.registry = self
+        cargo.handle = handle
+        return handle
+
+    def restore(self, cargo, handle):
+        """
+        Registers a cargo element under a known handle, used when loading a save game
+        :param cargo: Cargo - restored cargo
+        :param handle: int - handle the cargo had when it was saved
+        :return: None
+        """
+        self.cargos[handle] = cargo
+        cargo.registry = self
+        cargo.handle = handle
+
+    def since(self, handle):
+        """
+        Returns the registered cargo with a handle of at least the given one, in spawn order
+        :param handle: int
+        :return: list[Cargo]
+        """
+        newer = []
+        for cargo in reversed(self.cargos.values()):
+            if cargo.handle < handle:
+                break
+            newer.append(cargo)
+        newer.reverse()
+        return newer
+
+    def remove(self, cargo):
+        """
+        Unregisters a delivered cargo element
+        :param cargo: Cargo - registered cargo
+        :return: None
+        """
+        del self.cargos[cargo.handle]
+        cargo.handle = None
+
+    def __len__(self):
+        return len(self.cargos)
+
+    def __iter__(self):
+        return iter(self.cargos.values())
@@ -12,12 +12,22 @@ CARGO_TYPE_TO_IMAGE = {
     2: "img/gold.png",
     3: "img/crystal.png"
 }
+TRAIN_IMAGE = "img/chocho.png"
+LINE_COLOR_TO_TRAIN_IMAGE = {
+    "red": "img/chocho_red.png",
+    "blue": "img/chocho_blue.png",
+    "yellow": "img/chocho_yellow.png"
+}
 DAISY_PATH = "img/daisy.png"
+SPRITE_CACHE_DIR = ".sprite_cache"
 ELIMINATION_TIMER = 2000
 CARGO_SPOTS_PER_TROLLEY = 6
 CARGO_SPAWN_TICK_DELAY = 200
 STATION_SPAWN_TICK_DELAY = 2000
 MS_PER_TICK = 20
+MAX_FPS = 60
+MAX_TICKS_PER_FRAME = 100
+GAME_SPEEDS = [1, 2, 4, 8]
 TRAIN_SPEED = 5
 MAX_TRAINS_PER_LINE = 2
 
@@ -37,11 +47,36 @@ CARGO_VALUE = {
 FIELD_WIDTH = 1100
 FIELD_HEIGHT = 900
 EDGE_MARGIN = 100
+STATION_MIN_DISTANCE = 80
+STATION_PLACEMENT_ATTEMPTS = 30
+
+AUTOSAVE_FILE = "autosave.trsp"
+AUTOSAVE_TICKS = 1500  # ticks between two autosaves (30 seconds)
+SNAPSHOT_REWRITE_BYTES = 8 * 1024 * 1024  # autosave file size after which it is rewritten from scratch
+REPLAY_FILE = "last_session.trrp"
+REPLAY_KEYFRAME_TICKS = 3000  # ticks between two keyframes of a recorded session
+
+ENV_TICKS_PER_STEP = 50  # game ticks per step of the agent environment
+ENV_MAX_STATIONS = 128  # stations included in the observation of the agent environment
+ENV_MAX_TRAINS = MAX_LINES * (MAX_TRAINS_PER_LINE + 1)
+STRATEGY_TICKS = 50  # ticks between two decisions of a scripted build strategy
+BATCH_MAX_TICKS = 100000  # ticks after which a game of a batch run is stopped even if it was not lost
+OPTIMIZER_HORIZON = 3000  # ticks simulated per layout, ends before cargo of stations spawned meanwhile expires
+OPTIMIZER_POPULATION = 16  # layouts kept between two generations of the layout optimizer
+OPTIMIZER_OFFSPRING = 32  # layouts mutated per generation
+OPTIMIZER_GENERATIONS = 30
 
 UI_WIDTH = 1600
 UI_HEIGHT = 900
 UI_SIDEBAR_MARGIN = 500
 UI_STATION_RADIUS = 30
+TRACK_PICK_TOLERANCE = 5
+CAMERA_MIN_ZOOM = 0.2
+CAMERA_MAX_ZOOM = 3
+CAMERA_ZOOM_STEP = 1.1
+CAMERA_LOD_ZOOM = 0.6  # below this zoom cargo is drawn as count badges and trains as dots
 FLICKER_DURATION = 10
 
-CHOO_CHOO_SOUND = "sounds/chocho.wav"
\ No newline at end of file
+CHOO_CHOO_SOUND = "sounds/chocho.wav"
+AUDIO_VOICES = 4  # clips played at the same time
+AUDIO_QUEUE_SIZE = 8  # clips waiting for a voice, further requests are dropped
\ No newline at end of file
@@ -0,0 +1,225 @@
+"""
+Gym-style environment for automated agents (requires numpy)
+Steps a batch of independent headless games with one action per game and step.
+Observations are numpy arrays allocated once and filled in place, they are overwritten by the next step.
+
+Actions: integer array of shape (N, 4), one row (kind, a, b, c) per game
+    NOOP            (0, -, -, -)
+    BUY_LINE        (1, line id, start station id, end station id)
+    BUY_TRAIN       (2, line id, station id, -)
+    DEMOLISH_TRACK  (3, line id, track index, -)
+Station ids are indices into the station arrays of the observation, actions that break the building rules
+of the UI are ignored and flagged in info["invalid"].
+"""
+import numpy as np
+
+import Constants
+from maingame import Game
+
+NOOP = 0
+BUY_LINE = 1
+BUY_TRAIN = 2
+DEMOLISH_TRACK = 3
+
+NO_DEADLINE = np.iinfo(np.int64).max // 2  # expiry tick used while there is no cargo
+
+
+class TrainspottingEnv:
+    """
+    Batch of N independent games, reset(seed) starts new games and step(actions) advances all of them.
+    Finished games stay finished (done) until the next reset.
+    Entities beyond the capacities (max_stations, max_trains) are left out of the observation.
+    """
+    def __init__(self, num_envs, ticks_per_step=Constants.ENV_TICKS_PER_STEP,
+                 max_stations=Constants.ENV_MAX_STATIONS, max_trains=Constants.ENV_MAX_TRAINS, **game_options):
+        """
+        Constructor
+        :param num_envs: int - number of games stepped together
+        :param ticks_per_step: int - game ticks simulated per step
+        :param max_stations: int - station capacity of the observation
+        :param max_trains: int - train capacity of the observation
+        :param game_options: passed on to the Game constructor, e.g. batch_movement
+        """
+        self.num_envs = num_envs
+        self.ticks_per_step = ticks_per_step
+        self.max_stations = max_stations
+        self.max_trains = max_trains
+        self.game_options = game_options
+        self.games: list[Game] = []
+
+        n = num_envs
+        types = len(Constants.CARGO_TYPE_NAMES)
+        lines = Constants.MAX_LINES
+        self.observation = {
+            "tick": np.zeros(n, dtype=np.int64),
+            "money": np.zeros(n, dtype=np.float64),
+            "score": np.zeros(n, dtype=np.int64),
+            "station_count": np.zeros(n, dtype=np.int32),
+            "station_position": np.zeros((n, max_stations, 2), dtype=np.float32),
+            "station_type": np.full((n, max_stations), -1, dtype=np.int8),
+            "station_queue": np.zeros((n, max_stations, types), dtype=np.int32),  # waiting cargo per type
+            "station_deadline": np.zeros((n, max_stations), dtype=np.int64),  # ticks left of the most urgent cargo
+            "line_length": np.zeros((n, lines), dtype=np.int32),
+            "line_stations": np.full((n, lines, max_stations + 1), -1, dtype=np.int32),  # a loop repeats its start
+            "train_count": np.zeros(n, dtype=np.int32),
+            "train_line": np.full((n, max_trains), -1, dtype=np.int8),
+            "train_position": np.zeros((n, max_trains, 2), dtype=np.float32),
+            "train_load": np.zeros((n, max_trains, types), dtype=np.int32),  # loaded cargo per type
+            "train_deadline": np.zeros((n, max_trains), dtype=np.int64),
+        }
+        self.rewards = np.zeros(n, dtype=np.float64)
+        self.dones = np.zeros(n, dtype=bool)
+        self.info = {"invalid": np.zeros(n, dtype=bool)}
+
+        # absolute expiry ticks, turned into ticks left for the observation after every fill
+        self.station_expiry = np.full((n, max_stations), NO_DEADLINE, dtype=np.int64)
+        self.train_expiry = np.full((n, max_trains), NO_DEADLINE, dtype=np.int64)
+        self.filled_stations = [0] * n
+        self.filled_versions = [None] * n  # (static, semi_static) version of the last station and line fill
+
+    def reset(self, seed=None):
+        """
+        Starts new games
+        :param seed: int or list[int] - seed of the first game (the others use the following seeds)
+            or one seed per game, random seeds when None
+        :return: dict[str, np.ndarray] - observation
+        """
+        if seed is None:
+            seeds = [None] * self.num_envs
+        elif isinstance(seed, int):
+            seeds = [seed + i for i in range(self.num_envs)]
+        else:
+            seeds = list(seed)
+        self.games = [Game(seed=s, **self.game_options) for s in seeds]
+        self.filled_stations = [0] * self.num_envs
+        self.filled_versions = [None] * self.num_envs
+        self.observation["station_type"].fill(-1)
+        self.rewards.fill(0)
+        self.dones.fill(False)
+        self.info["invalid"].fill(False)
+        for i, game in enumerate(self.games):
+            self.fill(i, game)
+        self.update_deadlines()
+        return self.observation
+
+    def step(self, actions):
+        """
+        Performs one action per game and simulates ticks_per_step ticks of every running game
+        :param actions: array-like of shape (N, 4) - see module docstring
+        :return: tuple - observation, rewards (score gained), dones, info; all arrays are reused by the next step
+        """
+        invalid = self.info["invalid"]
+        for i, game in enumerate(self.games):
+            if game.game_over:
+                self.rewards[i] = 0
+                invalid[i] = False
+                continue
+            score = game.score
+            kind, a, b, c = (int(v) for v in actions[i])
+            invalid[i] = not self.apply(game, kind, a, b, c)
+            for _ in range(self.ticks_per_step):
+                game.tick()
+                if game.game_over:
+                    break
+            self.rewards[i] = game.score - score
+            self.dones[i] = game.game_over
+            self.fill(i, game)
+        self.update_deadlines()
+        return self.observation, self.rewards, self.dones, self.info
+
+    @staticmethod
+    def apply(game, kind, a, b, c):
+        """
+        Performs an action if it follows the building rules of the UI
+        :return: bool - False if the action was invalid
+        """
+        if kind == NOOP:
+            return True
+        if not 0 <= a < len(game.lines):
+            return False
+        line = game.lines[a]
+        stations = game.stations
+        if kind == BUY_LINE:
+            if not (0 <= b < len(stations) and 0 <= c < len(stations)) or b == c:
+                return False
+            if not line.is_valid_drag_point(stations[b]):
+                return False
+            game.buy_line(line, stations[b], stations[c])
+            return True
+        if kind == BUY_TRAIN:
+            if not 0 <= b < len(stations) or stations[b] not in line.stations or len(line.stations) < 2:
+                return False
+            game.buy_train(line, stations[b])
+            return True
+        if kind == DEMOLISH_TRACK:
+            if not 0 <= b < len(line.tracks) or not line.can_delete_track(b):
+                return False
+            game.demolish_track(line, b)
+            return True
+        return False
+
+    def fill(self, i, game):
+        """
+        Writes the state of a game into row i of the observation arrays
+        Stations and lines are only rewritten after they changed, trains every step
+        :return: None
+        """
+        obs = self.observation
+        obs["tick"][i] = game.tick_counter
+        obs["money"][i] = game.money
+        obs["score"][i] = game.score
+
+        station_count = min(len(game.stations), self.max_stations)
+        obs["station_count"][i] = station_count
+        for s in range(self.filled_stations[i], station_count):
+            station = game.stations[s]
+            obs["station_position"][i, s] = station.position
+            obs["station_type"][i, s] = station.cargo_type
+        self.filled_stations[i] = station_count
+
+        versions = (game.versions.static, game.versions.semi_static)
+        if versions != self.filled_versions[i]:
+            self.filled_versions[i] = versions
+            queues = obs["station_queue"][i]
+            expiry = self.station_expiry[i]
+            queues.fill(0)
+            expiry.fill(NO_DEADLINE)
+            for s in range(station_count):
+                for cargo_type, queue in game.stations[s].cargo_queues.items():
+                    if queue:
+                        queues[s, cargo_type] = len(queue)
+                        expiry[s] = min(expiry[s], min(cargo.expiry_tick for _, cargo in queue))
+
+            line_stations = obs["line_stations"][i]
+            line_stations.fill(-1)
+            for line in game.lines:
+                ids = [station.id for station in line.stations if station.id < self.max_stations]
+                obs["line_length"][i, line.id] = len(ids)
+                line_stations[line.id, :len(ids)] = ids
+
+        loads = obs["train_load"][i]
+        loads.fill(0)
+        obs["train_line"][i].fill(-1)
+        expiry = self.train_expiry[i]
+        expiry.fill(NO_DEADLINE)
+        r = 0
+        for line in game.lines:
+            for train in line.trains:
+                if r == self.max_trains:
+                    break
+                obs["train_line"][i, r] = line.id
+                obs["train_position"][i, r] = train.position
+                for cargo in train.cargo_load:
+                    loads[r, cargo.cargo_type] += 1
+                    expiry[r] = min(expiry[r], cargo.expiry_tick)
+                r += 1
+        obs["train_count"][i] = r
+
+    def update_deadlines(self):
+        """
+        Converts the absolute expiry ticks into ticks left, in place
+        :return: None
+        """
+        tick = self.observation["tick"][:, None]
+        np.subtract(self.station_expiry, tick, out=self.observation["station_deadline"])
+        np.subtract(self.train_expiry, tick, out=self.observation["train_deadline"])
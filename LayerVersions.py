@@ -0,0 +1,16 @@
+class LayerVersions:
+    """
+    Version counters for the render layers, shared between the main game and its stations and lines.
+    The model increments a counter whenever something drawn in that layer changes,
+    so the UI only has to redraw a layer when its counter differs from the last drawn one.
+    """
+    def __init__(self):
+        """
+        Constructor
+        static: tracks and stations (topology changes, new stations)
+        semi_static: cargo queues at stations and the current selection
+        dynamic: trains and HUD, changes every tick
+        """
+        self.static = 0
+        self.semi_static = 0
+        self.dynamic = 0
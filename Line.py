@@ -1,17 +1,87 @@
+import math
 from Station import *
 from Train import *
+from LayerVersions import LayerVersions
 
 class Line:
     """
     Represents a line element, identifiable in the main game by its color code,
     including a collection of stations and tracks, as well as trains
     """
-    def __init__(self, line_id: int, line_color: str):
+    def __init__(self, line_id: int, line_color: str, versions: 'LayerVersions' = None):
         self.id = line_id
         self.stations: list['Station'] = [] 
         self.trains: list['Train'] = []
         self.tracks: list[tuple['Station', 'Station']] = []
         self.color = line_color
+        self.versions = versions if versions is not None else LayerVersions()
+        self.topology_version = 0  # incremented on every change of stations or tracks of this line
+        self.type_counts: dict[int, int] = {}  # cargo type -> number of stations of that type
+        self.type_mask = 0  # bit n is set while the line services cargo type n
+        # (station index, direction) -> bitmask of cargo types a train can bring closer to delivery
+        self.reachable_types: dict[tuple[int, int], int] = {}
+        self.reachable_version = None
+        # (station index, direction) -> (length, inverse length, dx, dy) of the track towards the next station
+        self.segments: dict[tuple[int, int], tuple[float, float, float, float]] = None
+
+    def topology_changed(self):
+        """
+        Called after stations or tracks of this line changed
+        :return: None
+        """
+        for station in self.stations:
+            station.update_connected_mask()
+        self.segments = None
+        for train in self.trains:
+            train.cached_position = None
+        self.topology_version += 1
+        self.versions.static += 1
+
+    def count_station(self, station: 'Station', delta: int):
+        """
+        Updates the type histogram and bitmask when a station enters (+1) or leaves (-1) the line
+        :param station: Station - added or removed station
+        :param delta: int - +1 or -1
+        :return: None
+        """
+        count = self.type_counts.get(station.cargo_type, 0) + delta
+        self.type_counts[station.cargo_type] = count
+        if count > 0:
+            self.type_mask |= 1 << station.cargo_type
+        else:
+            self.type_mask &= ~(1 << station.cargo_type)
+
+    def segment(self, station_index: int, direction: int):
+        """
+        Returns the cached geometry of the track a train at the given station drives along.
+        Station positions never move, so the geometry only has to be rebuilt after topology changes.
+        :param station_index: int - index of the start station
+        :param direction: int - 1 (forward) or -1 (backward)
+        :return: tuple[float, float, float, float] - length, inverse length (0 for zero length)
+            and direction vector (dx, dy) from start to end station, None past the end of the line
+        """
+        if self.segments is None:
+            self.build_segments()
+        return self.segments.get((station_index, direction))
+
+    def build_segments(self):
+        """
+        Precomputes the track geometry for every station index and direction
+        :return: None
+        """
+        self.segments = {}
+        n = len(self.stations)
+        for i in range(n):
+            x1, y1 = self.stations[i].position
+            for direction in (1, -1):
+                if i + direction >= n:
+                    continue
+                # index -1 wraps to the last station, like the list lookup the trains did before
+                x2, y2 = self.stations[i + direction].position
+                dx = x2 - x1
+                dy = y2 - y1
+                length = math.sqrt(dx ** 2 + dy ** 2)
+                self.segments[(i, direction)] = (length, 1 / length if length > 0 else 0.0, dx, dy)
 
     def tick(self, tick_counter):
         """
@@ -46,6 +116,8 @@ class Line:
         else:
             self.stations.append(station)
             station.attached_lines.add(self) # updates line set for station
+        self.count_station(station, 1)
+        self.topology_changed()
 
     def remove_station(self, station: 'Station'):
         """
@@ -69,6 +141,9 @@ class Line:
                     self.tracks.insert(index-1, (prev_station, next_station))
 
             self.stations.remove(station)
+            self.count_station(station, -1)
+            station.update_connected_mask()
+            self.topology_changed()
 
     def can_delete_track(self, track: int) -> bool:
         """
@@ -113,6 +188,7 @@ class Line:
 
             if was_loop:
                 # It's a loop, so we're opening it into a simple line.
+                self.count_station(self.stations[-1], -1)  # the closing duplicate is dropped
                 new_stations = self.stations[track + 1:-1] + self.stations[:track + 1]
                 self.stations = new_stations
             else:
@@ -147,7 +223,11 @@ class Line:
 
             # Remove last station if only 1 remains
             if len(self.stations) == 1:
+                last_station = self.stations[0]
+                last_station.attached_lines.discard(self)
+                self.count_station(last_station, -1)
                 self.stations.clear()
+                last_station.update_connected_mask()
 
             # Safely remove trains
             for train in trains_to_remove:
@@ -158,6 +238,8 @@ class Line:
             if not self.stations:
                 self.trains.clear()
 
+            self.topology_changed()
+
     def is_valid_drag_point(self, station: 'Station') -> bool:
         """
         Check if dragging to this station is allowed.
@@ -198,10 +280,64 @@ class Line:
         :param cargo_type: int - id of the checked cargo
         :return: Bool
         """
-        for station in self.stations:
-            if station.cargo_type == cargo_type:
-                return True
-        return False
+        return self.type_mask >> cargo_type & 1 == 1
+
+    def deliverable_types(self, station_index: int, direction: int) -> int:
+        """
+        Looks up which cargo types a train at the given station and direction moves towards.
+        The table is rebuilt lazily after a topology change of any line sharing the version counters,
+        because transfers depend on the lines attached to the downstream stations.
+        :param station_index: int - index of the train's current station
+        :param direction: int - 1 (forward) or -1 (backward)
+        :return: int - bitmask with bit n set for every deliverable cargo type n
+        """
+        if self.reachable_version != self.versions.static:
+            self.build_reachability()
+        return self.reachable_types.get((station_index, direction), 0)
+
+    def build_reachability(self):
+        """
+        Precomputes deliverable_types for every station index and direction of this line.
+        A type is deliverable if a downstream station has that type, or if neither this line
+        nor the current station can deliver it and a line attached to a downstream station can.
+        :return: None
+        """
+        self.reachable_types = {}
+        self.reachable_version = self.versions.static
+        if not self.stations:
+            return
+
+        line_mask = self.type_mask
+        own_masks = [1 << sta.cargo_type for sta in self.stations]
+        transfer_masks = [sta.connected_mask for sta in self.stations]  # types serviced by the attached lines
+
+        n = len(self.stations)
+        if self.stations[0] == self.stations[-1]:
+            # loop: every station of the line is downstream
+            own = line_mask
+            transfer = 0
+            for mask in transfer_masks:
+                transfer |= mask
+            for i in range(n):
+                mask = own | transfer & ~(line_mask | transfer_masks[i])
+                self.reachable_types[(i, 1)] = mask
+                self.reachable_types[(i, -1)] = mask
+            return
+
+        # forward: stations after i, backward: stations before i
+        own_after = [0] * (n + 1)
+        transfer_after = [0] * (n + 1)
+        for i in range(n - 1, -1, -1):
+            own_after[i] = own_after[i + 1] | own_masks[i]
+            transfer_after[i] = transfer_after[i + 1] | transfer_masks[i]
+        own_before = 0
+        transfer_before = 0
+        for i in range(n):
+            blocked = line_mask | transfer_masks[i]
+            self.reachable_types[(i, 1)] = own_after[i + 1] | transfer_after[i + 1] & ~blocked
+            self.reachable_types[(i, -1)] = own_before | transfer_before & ~blocked
+            own_before |= own_masks[i]
+            transfer_before |= transfer_masks[i]
 
     def get_next_stop(self, current_station: 'Station', current_direction: int) -> tuple['Station', int]:
         """
@@ -0,0 +1,285 @@
+import Constants
+from Camera import Camera
+
+
+class CanvasRenderer:
+    """
+    Retained-mode renderer for the playing field.
+    Keeps one persistent canvas item per drawn entity and only moves or reconfigures it when it changed,
+    items are created when an entity appears and deleted when it disappears.
+    Items are grouped into a static (tracks, stations), semi-static (cargo queues, selection)
+    and dynamic (trains, HUD) layer, each redrawn only when its LayerVersions counter or the camera changed.
+    Entities outside the camera view are culled before any canvas call, so their items get swept.
+    When zoomed out, cargo is drawn as one count badge per cargo type and trains as dots.
+    """
+    # stacking order of the canvas items, bottom to top
+    LAYERS = ("track", "highlight", "station", "selected", "icon", "warn", "cargo",
+              "train", "train_warn", "train_cargo", "hud")
+    # cargo starts flickering when it has less ticks left than this
+    WARN_TICKS = 500
+    # screen pixels around the view in which entities are still drawn, cargo sprites reach out next to them
+    CULL_MARGIN = 150
+
+    def __init__(self, canvas, cargo_images_small, cargo_images, train_images, train_image=None, camera=None):
+        """
+        Constructor
+        :param canvas: tk.Canvas - canvas to draw on
+        :param cargo_images_small: Mapping[int, PhotoImage] - cargo sprites by cargo type
+        :param cargo_images: Mapping[int, PhotoImage] - station icons by cargo type
+        :param train_images: Mapping[str, PhotoImage] - train sprites by line color
+        :param train_image: PhotoImage - fallback train sprite for colors missing in train_images
+        :param camera: Camera - zoom and pan of the view, unmoved if not given
+        """
+        self.canvas = canvas
+        self.cargo_images_small = cargo_images_small
+        self.cargo_images = cargo_images
+        self.train_images = train_images
+        self.train_image = train_image
+        self.camera = camera if camera is not None else Camera()
+        # key -> [item id, coords, options, frame, stacking layer]
+        self.items = {"static": {}, "semi_static": {}, "dynamic": {}}
+        self.layer_items = dict.fromkeys(self.LAYERS, 0)  # stacking layer -> number of canvas items
+        self.frame = 0
+        self.drawn_versions = {}  # layer -> state the layer was last drawn with
+        self.semi_static_redraw_tick = None  # tick at which a cargo starts or toggles its warning
+
+    def sync(self, layer, key, kind, tags, coords, **options):
+        """
+        Makes sure a canvas item exists for the key and matches the given coords and options
+        :param layer: str - render layer owning the item
+        :param key: hashable - identity of the drawn entity
+        :param kind: str - canvas item type ("line", "oval", "image", "text")
+        :param tags: str or tuple - canvas tags, the last one names the stacking layer
+        :param coords: tuple - item coordinates
+        :param options: item options, compared against the last drawn state
+        :return: None
+        """
+        items = self.items[layer]
+        entry = items.get(key)
+        if entry is None:
+            item = getattr(self.canvas, "create_" + kind)(*coords, tags=tags, **options)
+            stacking = tags if isinstance(tags, str) else tags[-1]
+            self.stack(item, stacking)
+            items[key] = [item, coords, options, self.frame, stacking]
+            return
+
+        entry[3] = self.frame
+        if entry[1] != coords:
+            self.canvas.coords(entry[0], *coords)
+            entry[1] = coords
+        if entry[2] != options:
+            old = entry[2]
+            self.canvas.itemconfig(entry[0], **{k: v for k, v in options.items() if old.get(k) != v})
+            entry[2] = options
+
+    def stack(self, item, stacking):
+        """
+        Moves a new item below the items of all higher stacking layers, a single canvas call at most
+        New items start on top of the canvas, so nothing has to move if no higher layer has items
+        :param item: int - id of the new canvas item
+        :param stacking: str - stacking layer of the item, one of LAYERS
+        :return: None
+        """
+        for above in self.LAYERS[self.LAYERS.index(stacking) + 1:]:
+            if self.layer_items[above]:
+                self.canvas.tag_lower(item, above)
+                break
+        self.layer_items[stacking] += 1
+
+    def delete(self, entry):
+        self.canvas.delete(entry[0])
+        self.layer_items[entry[4]] -= 1
+
+    def sweep(self, layer):
+        """
+        Deletes the canvas items of all entities of the layer that were not drawn in the current frame
+        :param layer: str - render layer that was just redrawn
+        :return: None
+        """
+        items = self.items[layer]
+        stale = [key for key, entry in items.items() if entry[3] != self.frame]
+        for key in stale:
+            self.delete(items.pop(key))
+
+    def clear(self):
+        """
+        Deletes every canvas item owned by the renderer
+        :return: None
+        """
+        for items in self.items.values():
+            for entry in items.values():
+                self.delete(entry)
+            items.clear()
+        self.drawn_versions.clear()
+
+    def draw(self, game, fps, alpha, building_text):
+        """
+        Brings the canvas up to date with the game state, redrawing only the layers whose version changed
+        :param game: Game - game to draw
+        :param fps: float - measured ticks per second for the HUD
+        :param alpha: float - fraction of a tick elapsed since the last tick, used to interpolate trains
+        :param building_text: str or None - info text while a track is being built
+        :return: None
+        """
+        self.frame += 1
+        versions = game.versions
+        view = self.camera.version
+
+        if self.drawn_versions.get("static") != (versions.static, view):
+            self.draw_tracks(game)
+            self.draw_stations(game)
+            self.sweep("static")
+            self.drawn_versions["static"] = (versions.static, view)
+
+        semi_static = (versions.static, versions.semi_static, view)
+        if (self.drawn_versions.get("semi_static") != semi_static or
+                self.semi_static_redraw_tick is not None and game.tick_counter >= self.semi_static_redraw_tick):
+            self.semi_static_redraw_tick = None
+            self.draw_selection(game)
+            self.draw_station_cargo(game)
+            self.sweep("semi_static")
+            self.drawn_versions["semi_static"] = semi_static
+
+        dynamic = (versions.dynamic, alpha, fps, building_text, view)
+        if self.drawn_versions.get("dynamic") != dynamic:
+            self.draw_hud(game, fps, building_text)
+            self.draw_trains(game, alpha)
+            self.sweep("dynamic")
+            self.drawn_versions["dynamic"] = dynamic
+
+    def draw_hud(self, game, fps, building_text):
+        """
+        Draws tick rate, score, money and building info
+        """
+        self.sync("dynamic", "tps", "text", "hud", (20, 20), text=f"TPS: {fps:.2f} ({game.speed}x)", anchor="w")
+        self.sync("dynamic", "score", "text", "hud", (1050, 20), text=f"Score: {game.score}", anchor="e")
+        self.sync("dynamic", "money", "text", "hud", (1050, 40), text=f"Money: {game.money:.2f}$$", anchor="e")
+        if building_text:
+            self.sync("dynamic", "building", "text", "hud", (20, 50), text=building_text, anchor="w")
+
+    def draw_tracks(self, game):
+        """
+        Draws all visible tracks
+        """
+        camera = self.camera
+        width = max(1, 5 * camera.zoom)
+        for (line, trk_iter), (x1, y1, x2, y2) in game.track_index.query_rect(*camera.visible_rect()).items():
+            coords = camera.to_screen(x1, y1) + camera.to_screen(x2, y2)
+            self.sync("static", ("track", line.id, trk_iter), "line", "track", coords,
+                      fill=line.color, width=width)
+
+    def visible_stations(self, game):
+        """
+        Returns the stations inside the camera view
+        :return: generator of Station
+        """
+        return game.station_grid.query_rect(*self.camera.visible_rect(self.CULL_MARGIN))
+
+    def draw_stations(self, game):
+        """
+        Draws all visible stations with their icon, once per station
+        """
+        radius = Constants.UI_STATION_RADIUS * self.camera.zoom
+        for sta in self.visible_stations(game):
+            x, y = self.camera.to_screen(*sta.position)
+            self.sync("static", ("station", sta), "oval", "station", (x - radius, y - radius, x + radius, y + radius),
+                      fill="gray", outline="black", width=1)
+            self.sync("static", ("icon", sta), "image", "icon", (x, y), image=self.cargo_images[sta.cargo_type])
+
+    def draw_selection(self, game):
+        """
+        Highlights the selected station or track
+        """
+        camera = self.camera
+        sel = game.selection
+        if type(sel) == tuple:
+            trk = sel[0].tracks[sel[1]]
+            coords = camera.to_screen(*trk[0].position) + camera.to_screen(*trk[1].position)
+            self.sync("semi_static", ("selection", "track"), "line", "highlight", coords, fill="white", width=2)
+        elif sel is not None:
+            radius = Constants.UI_STATION_RADIUS * camera.zoom
+            x, y = camera.to_screen(*sel.position)
+            self.sync("semi_static", ("selection", "station"), "oval", "selected", (x - radius, y - radius, x + radius, y + radius),
+                      fill="lightgray", outline="gray", width=3)
+
+    def draw_station_cargo(self, game):
+        """
+        Draws the cargo waiting at visible stations, as count badges when zoomed out
+        """
+        radius = Constants.UI_STATION_RADIUS * self.camera.zoom
+        detailed = self.camera.is_detailed()
+        for sta in self.visible_stations(game):
+            x, y = self.camera.to_screen(*sta.position)
+            if detailed:
+                for i, crg in enumerate(sta.cargo_load):
+                    crg_x = x + radius + 20 + (i % 3) * 20
+                    crg_y = y - radius + (i // 3) * 20
+                    self.draw_cargo(game, "semi_static", crg, crg.cargo_type, crg.ticks_left(game.tick_counter),
+                                    crg_x, crg_y, "warn", "cargo")
+                continue
+
+            row = 0
+            for cargo_type, queue in sorted(sta.cargo_queues.items()):
+                if not queue:
+                    continue
+                ticks_left = min(crg.ticks_left(game.tick_counter) for _, crg in queue)
+                crg_x = x + radius + 12
+                crg_y = y - radius + row * 20
+                self.draw_cargo(game, "semi_static", (sta, cargo_type), cargo_type, ticks_left,
+                                crg_x, crg_y, "warn", "cargo")
+                self.sync("semi_static", ("count", sta, cargo_type), "text", "cargo", (crg_x + 10, crg_y),
+                          text=str(len(queue)), anchor="w")
+                row += 1
+
+    def draw_trains(self, game, alpha):
+        """
+        Draws all visible trains at their interpolated position with their loaded cargo, as dots when zoomed out
+        """
+        camera = self.camera
+        x1, y1, x2, y2 = camera.visible_rect(self.CULL_MARGIN)
+        detailed = camera.is_detailed()
+        for line in game.lines:
+            if not line.trains:
+                continue
+            train_img = self.train_images.get(line.color) or self.train_image
+            for trn in line.trains:
+                x, y = trn.render_position(alpha)
+                if not (x1 <= x <= x2 and y1 <= y <= y2):
+                    continue
+                x, y = camera.to_screen(x, y)
+                if not detailed:
+                    self.sync("dynamic", ("train_dot", trn), "oval", "train", (x - 4, y - 4, x + 4, y + 4),
+                              fill=line.color, outline="black", width=1)
+                    continue
+
+                self.sync("dynamic", ("train", trn), "image", "train", (x, y), image=train_img)
+
+                # Draw Cargo (in trains)
+                for i, crg in enumerate(trn.cargo_load):
+                    crg_x = x + 24 + (i % 3) * 20
+                    crg_y = y - 8 + (i // 3) * 20
+                    self.draw_cargo(game, "dynamic", crg, crg.cargo_type, crg.ticks_left(game.tick_counter),
+                                    crg_x, crg_y, "train_warn", "train_cargo")
+
+    def draw_cargo(self, game, layer, key, cargo_type, ticks_left, crg_x, crg_y, warn_tag, tag):
+        """
+        Draws a single cargo sprite, with a flickering warning when it is about to time out.
+        Schedules the next semi-static redraw for when a warning starts or toggles.
+        :param key: hashable - identity of the cargo or count badge
+        :param ticks_left: int - ticks until the (oldest) cargo times out
+        """
+        image = self.cargo_images_small[cargo_type]
+        if ticks_left < self.WARN_TICKS:
+            flicker_on = (game.tick_counter // Constants.FLICKER_DURATION) % 2 == 0
+            x1 = crg_x - image.width() // 2 - 3
+            y1 = crg_y - image.height() // 2 - 3
+            x2 = crg_x + image.width() // 2 + 4
+            y2 = crg_y + image.height() // 2 + 4
+            self.sync(layer, (warn_tag, key), "oval", warn_tag, (x1, y1, x2, y2),
+                      fill="red", state="normal" if flicker_on else "hidden")
+            redraw_tick = (game.tick_counter // Constants.FLICKER_DURATION + 1) * Constants.FLICKER_DURATION
+        else:
+            redraw_tick = game.tick_counter + ticks_left - self.WARN_TICKS + 1
+        if layer == "semi_static" and (self.semi_static_redraw_tick is None or redraw_tick < self.semi_static_redraw_tick):
+            self.semi_static_redraw_tick = redraw_tick
+        self.sync(layer, (tag, key), "image", tag, (crg_x, crg_y), image=image)
@@ -0,0 +1,214 @@
+"""
+Recording and replaying game sessions
+A session is the stream of player actions, each stamped with the tick before which it happened,
+plus full snapshots (keyframes) of the game taken every few thousand ticks. The game logic only depends
+on its seeded random generator and these actions, so re-simulating from a keyframe reproduces the session.
+Replay file: header, then records of (kind: u8, tick: i64, payload length: u32, payload), all little-endian.
+"""
+import struct
+import time
+
+import Constants
+from Snapshot import snapshot_bytes, restore_game, pack_array, unpack_array
+
+MAGIC = b"TRRP"
+FORMAT_VERSION = 2  # keyframes are snapshots, bumped with the snapshot format
+HEADER = struct.Struct("<4sH")
+RECORD = struct.Struct("<BqI")
+
+KEYFRAME = 1
+ACTION = 2
+END = 3  # tick at which the recording was saved, no payload
+
+# recorded game events -> action id, the arguments are stored as ids
+ACTIONS = {
+    "line_bought": 1,
+    "train_bought": 2,
+    "track_demolished": 3,
+}
+
+
+def encode_action(event, data):
+    """
+    Converts a game event into the ids needed to perform the action again
+    :return: list[int]
+    """
+    if event == "line_bought":
+        return [data["line"].id, data["start_station"].id, data["end_station"].id]
+    if event == "train_bought":
+        return [data["line"].id, data["station"].id]
+    return [data["line"].id, data["track"]]
+
+
+def apply_action(game, action, args):
+    """
+    Performs a recorded action on the game
+    :param game: Game
+    :param action: int - value of ACTIONS
+    :param args: list[int] - ids stored by encode_action
+    :return: None
+    """
+    line = game.lines[args[0]]
+    if action == ACTIONS["line_bought"]:
+        game.buy_line(line, game.stations[args[1]], game.stations[args[2]])
+    elif action == ACTIONS["train_bought"]:
+        game.buy_train(line, game.stations[args[1]])
+    elif action == ACTIONS["track_demolished"]:
+        game.demolish_track(line, args[1])
+
+
+class SessionRecorder:
+    """
+    Records the actions of a running game as listener and takes a keyframe every REPLAY_KEYFRAME_TICKS
+    """
+    def __init__(self, game, keyframe_interval=Constants.REPLAY_KEYFRAME_TICKS):
+        """
+        Constructor
+        Registers with the game and takes the first keyframe
+        :param game: Game - game to record, before its first tick or right after loading it
+        :param keyframe_interval: int - ticks between two keyframes
+        """
+        self.game = game
+        self.keyframe_interval = keyframe_interval
+        self.keyframes: list[tuple[int, bytes]] = []  # (tick, snapshot), ascending
+        self.actions: list[tuple[int, int, list[int]]] = []  # (tick, action, args) in recording order
+        self.take_keyframe()
+        game.add_listener(self.on_event)
+
+    def on_event(self, event, data):
+        """
+        Game listener, stores player actions
+        :return: None
+        """
+        action = ACTIONS.get(event)
+        if action is not None:
+            self.actions.append((self.game.tick_counter, action, encode_action(event, data)))
+
+    def take_keyframe(self):
+        """
+        Stores a full snapshot of the game at its current tick
+        :return: None
+        """
+        self.keyframes.append((self.game.tick_counter, snapshot_bytes(self.game)))
+
+    def maybe_keyframe(self):
+        """
+        Takes a keyframe if the last one is at least keyframe_interval ticks old.
+        Called by the game loop after ticking and before handling input, so the keyframe holds no action of its tick
+        :return: None
+        """
+        if self.game.tick_counter - self.keyframes[-1][0] >= self.keyframe_interval:
+            self.take_keyframe()
+
+    def save(self, path):
+        """
+        Writes the recorded session into a replay file
+        :param path: str - replay file
+        :return: None
+        """
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION))
+            for tick, snapshot in self.keyframes:
+                f.write(RECORD.pack(KEYFRAME, tick, len(snapshot)) + snapshot)
+            for tick, action, args in self.actions:
+                payload = struct.pack("<B", action) + pack_array("q", args)
+                f.write(RECORD.pack(ACTION, tick, len(payload)) + payload)
+            f.write(RECORD.pack(END, self.game.tick_counter, 0))
+
+
+class Replay:
+    """
+    Re-simulates a recorded session headless, as fast as possible
+    """
+    def __init__(self, keyframes, actions, last_tick):
+        """
+        Constructor
+        :param keyframes: list[tuple[int, bytes]] - (tick, snapshot), ascending
+        :param actions: list[tuple[int, int, list[int]]] - (tick, action, args) in recording order
+        :param last_tick: int - tick counter at the end of the recording
+        """
+        self.keyframes = keyframes
+        self.actions = actions
+        self.last_tick = last_tick
+
+    @classmethod
+    def from_recorder(cls, recorder):
+        return cls(list(recorder.keyframes), list(recorder.actions), recorder.game.tick_counter)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a replay file
+        :param path: str - replay file
+        :return: Replay
+        """
+        with open(path, "rb") as f:
+            buffer = f.read()
+        magic, version = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a replay of version {FORMAT_VERSION}")
+        keyframes = []
+        actions = []
+        last_tick = None
+        offset = HEADER.size
+        while offset + RECORD.size <= len(buffer):
+            kind, tick, length = RECORD.unpack_from(buffer, offset)
+            start = offset + RECORD.size
+            payload = buffer[start:start + length]
+            if kind == KEYFRAME:
+                keyframes.append((tick, payload))
+            elif kind == ACTION:
+                args, _ = unpack_array("q", payload, 1)
+                actions.append((tick, payload[0], list(args)))
+            elif kind == END:
+                last_tick = tick
+            offset = start + length
+        if last_tick is None:
+            last_tick = max([tick for tick, _ in keyframes] + [tick for tick, _, _ in actions])
+        return cls(keyframes, actions, last_tick)
+
+    def seek(self, tick, **game_options):
+        """
+        Restores the game state before the given tick from the nearest keyframe at or before it
+        and re-simulates the remaining ticks with the recorded actions
+        :param tick: int - tick counter of the returned game, actions recorded at this tick are not performed yet
+        :param game_options: passed on to the Game constructor, e.g. batch_movement
+        :return: Game
+        """
+        snapshot = self.keyframes[0][1]
+        for keyframe_tick, keyframe in self.keyframes:
+            if keyframe_tick > tick:
+                break
+            snapshot = keyframe
+        game = restore_game(snapshot, **game_options)
+        self.run(game, tick)
+        return game
+
+    def run(self, game, until=None):
+        """
+        Ticks the game up to the given tick, performing the recorded actions on the way
+        :param game: Game - game restored from a keyframe of this replay
+        :param until: int - tick counter to stop at, the end of the recording if None
+        :return: None
+        """
+        until = self.last_tick if until is None else until
+        pending = iter([action for action in self.actions if action[0] >= game.tick_counter])
+        action = next(pending, None)
+        while game.tick_counter < until and not game.game_over:
+            while action is not None and action[0] == game.tick_counter:
+                apply_action(game, action[1], action[2])
+                action = next(pending, None)
+            game.tick()
+
+    def play(self, until=None, **game_options):
+        """
+        Replays the whole session from its first keyframe
+        :param until: int - tick counter to stop at, the end of the recording if None
+        :return: tuple[Game, float] - final game state and the reached ticks per second
+        """
+        game = restore_game(self.keyframes[0][1], **game_options)
+        start_tick = game.tick_counter
+        start = time.perf_counter()
+        self.run(game, until)
+        elapsed = time.perf_counter() - start
+        return game, (game.tick_counter - start_tick) / elapsed if elapsed > 0 else float("inf")
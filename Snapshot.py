@@ -0,0 +1,386 @@
+"""
+Binary save games
+A snapshot file starts with a small header followed by records of (kind: u8, payload length: u32, payload).
+Object references are stored as ids: stations by their index in Game.stations, cargo by its registry handle.
+Stations never leave the field, so STATIONS records only hold the stations added since the previous record.
+LINES records are only written after a line changed, CARGO records hold the cargo spawned since the previous one.
+Every save ends with a STATE record of the frequently changing state (money, trains, cargo placement,
+random generator), the last STATE record together with everything before it describes the saved game.
+Records behind the last STATE record belong to a save that did not complete and are ignored.
+All numbers are little-endian, arrays are stored as element count (u32) followed by the raw elements.
+"""
+import os
+import sys
+import math
+import heapq
+import struct
+from array import array
+from collections import deque
+
+import Constants
+from Cargo import Cargo
+from Station import Station
+from Train import Train
+
+MAGIC = b"TRSP"
+FORMAT_VERSION = 3
+HEADER = struct.Struct("<4sH")
+RECORD = struct.Struct("<BI")
+GAME_STATE = struct.Struct("<qdqBq")  # tick counter, money, score, game over, next cargo handle
+RNG_STATE = struct.Struct("<qBd")  # seed, generator version, gauss_next (nan if unset), followed by the state words
+
+STATIONS = 1
+LINES = 2
+CARGO = 3
+STATE = 4
+
+
+def pack_array(typecode, values):
+    """
+    Encodes a sequence of numbers as count and raw little-endian elements
+    :param typecode: str - array module type code
+    :param values: iterable of numbers
+    :return: bytes
+    """
+    data = array(typecode, values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return struct.pack("<I", len(data)) + data.tobytes()
+
+
+def unpack_array(typecode, buffer, offset):
+    """
+    Decodes an array written by pack_array
+    :param typecode: str - array module type code
+    :param buffer: bytes
+    :param offset: int - position of the element count
+    :return: tuple[array, int] - decoded array and the offset behind it
+    """
+    count = struct.unpack_from("<I", buffer, offset)[0]
+    offset += 4
+    data = array(typecode)
+    end = offset + count * data.itemsize
+    data.frombytes(buffer[offset:end])
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data, end
+
+
+def record(kind, *parts):
+    """
+    Frames the payload parts as a single record
+    :return: bytes
+    """
+    payload = b"".join(parts)
+    return RECORD.pack(kind, len(payload)) + payload
+
+
+class SnapshotWriter:
+    """
+    Saves a game into a snapshot file, every save after the first only appends what changed since the last one.
+    The file is rewritten from scratch once it grew beyond SNAPSHOT_REWRITE_BYTES.
+    """
+    def __init__(self, game, path=None):
+        """
+        Constructor
+        :param game: Game - game to save
+        :param path: str - snapshot file, replaced by the first save (None if only used for snapshot_bytes)
+        """
+        self.game = game
+        self.path = path
+        self.written_stations = 0
+        self.written_lines = None  # topology versions of the lines at the last LINES record
+        self.written_handle = 0  # cargo with a handle below this is already in the file
+        self.saved_tick = None
+        self.saved_size = None  # file size after the last completed save, None if the next save rewrites the file
+
+    def save(self):
+        """
+        Writes the current state of the game
+        An append starts by cutting off whatever an earlier, failed append left behind the last completed save.
+        A save that fails itself makes the next one rewrite the file, as the written_* counters already moved on
+        :return: None
+        """
+        saved_size = self.saved_size
+        self.saved_size = None
+        if saved_size is None or saved_size > Constants.SNAPSHOT_REWRITE_BYTES:
+            self.written_stations = 0
+            self.written_lines = None
+            self.written_handle = 0
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION) + self.records())
+                saved_size = f.tell()
+            os.replace(temp_path, self.path)
+        else:
+            with open(self.path, "r+b") as f:
+                f.truncate(saved_size)
+                f.seek(saved_size)
+                f.write(self.records())
+                saved_size = f.tell()
+        self.saved_size = saved_size
+        self.saved_tick = self.game.tick_counter
+
+    def maybe_save(self, interval=Constants.AUTOSAVE_TICKS):
+        """
+        Autosave, saves if the last save is at least the given number of ticks ago
+        :param interval: int - ticks between two saves
+        :return: bool - True if the game was saved
+        """
+        if self.saved_tick is not None and self.game.tick_counter - self.saved_tick < interval:
+            return False
+        self.save()
+        return True
+
+    def records(self):
+        """
+        Encodes everything that changed since the last save
+        :return: bytes
+        """
+        game = self.game
+        game.sync_trains()
+        data = []
+
+        if len(game.stations) > self.written_stations:
+            new = game.stations[self.written_stations:]
+            data.append(record(
+                STATIONS,
+                pack_array("d", [sta.position[0] for sta in new]),
+                pack_array("d", [sta.position[1] for sta in new]),
+                pack_array("B", [sta.cargo_type for sta in new]),
+            ))
+            self.written_stations = len(game.stations)
+
+        line_versions = [line.topology_version for line in game.lines]
+        if line_versions != self.written_lines:
+            data.append(record(
+                LINES,
+                pack_array("I", [len(line.stations) for line in game.lines]),
+                pack_array("I", [sta.id for line in game.lines for sta in line.stations]),
+            ))
+            self.written_lines = line_versions
+
+        new_cargo = game.cargos.since(self.written_handle)
+        if new_cargo:
+            data.append(record(
+                CARGO,
+                pack_array("q", [crg.handle for crg in new_cargo]),
+                pack_array("B", [crg.cargo_type for crg in new_cargo]),
+                pack_array("q", [crg.spawn_tick for crg in new_cargo]),
+                pack_array("q", [crg.expiry_tick for crg in new_cargo]),
+            ))
+        self.written_handle = game.cargos.next_handle
+
+        waiting = [entry for sta in game.stations for queue in sta.cargo_queues.values() for entry in queue]
+        trains = [train for line in game.lines for train in line.trains]
+        rng_version, rng_words, gauss_next = game.rng.getstate()
+        data.append(record(
+            STATE,
+            GAME_STATE.pack(game.tick_counter, game.money, game.score, game.game_over, game.cargos.next_handle),
+            pack_array("B", game.possible_types),
+            pack_array("B", game.available_stations),
+            pack_array("I", [sta.arrivals for sta in game.stations]),
+            pack_array("I", [sta.cargo_count for sta in game.stations]),
+            pack_array("I", [arrival for arrival, _ in waiting]),
+            pack_array("q", [crg.handle for _, crg in waiting]),
+            pack_array("B", [train.line.id for train in trains]),
+            pack_array("i", [train.current_station_index for train in trains]),
+            pack_array("b", [train.direction for train in trains]),
+            pack_array("d", [train.progress for train in trains]),
+            pack_array("i", [train.wait_timer for train in trains]),
+            pack_array("B", [len(train.cargo_load) for train in trains]),
+            pack_array("q", [crg.handle for train in trains for crg in train.cargo_load]),
+            RNG_STATE.pack(game.seed, rng_version, float("nan") if gauss_next is None else gauss_next),
+            pack_array("I", rng_words),
+            pack_array("q", game.deliveries),
+        ))
+        return b"".join(data)
+
+
+def snapshot_bytes(game):
+    """
+    Encodes a complete snapshot of the game in memory, e.g. as replay keyframe
+    :param game: Game
+    :return: bytes - contents of a snapshot file
+    """
+    return HEADER.pack(MAGIC, FORMAT_VERSION) + SnapshotWriter(game).records()
+
+
+def save_game(game, path):
+    """
+    Writes a complete snapshot of the game
+    :param game: Game
+    :param path: str - snapshot file
+    :return: None
+    """
+    SnapshotWriter(game, path).save()
+
+
+def read_records(buffer):
+    """
+    Splits the contents of a snapshot file into records up to the last STATE record.
+    Everything behind it, complete records as well as a torn one, was written by an append that did not finish
+    :param buffer: bytes - snapshot file contents
+    :return: list[tuple[int, bytes]] - kind and payload
+    """
+    magic, version = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"not a snapshot of version {FORMAT_VERSION}")
+    records = []
+    saved = 0  # number of records up to and including the last STATE record
+    offset = HEADER.size
+    while offset + RECORD.size <= len(buffer):
+        kind, length = RECORD.unpack_from(buffer, offset)
+        start = offset + RECORD.size
+        if start + length > len(buffer):
+            break
+        records.append((kind, buffer[start:start + length]))
+        if kind == STATE:
+            saved = len(records)
+        offset = start + length
+    return records[:saved]
+
+
+def load_game(path, **game_options):
+    """
+    Rebuilds a game from a snapshot file
+    :param path: str - snapshot file
+    :param game_options: passed on to the Game constructor, e.g. batch_movement
+    :return: Game
+    """
+    with open(path, "rb") as f:
+        return restore_game(f.read(), **game_options)
+
+
+def restore_game(buffer, **game_options):
+    """
+    Rebuilds a game from the contents of a snapshot file
+    :param buffer: bytes - snapshot file contents, e.g. from snapshot_bytes
+    :param game_options: passed on to the Game constructor, e.g. batch_movement
+    :return: Game
+    """
+    from maingame import Game
+
+    game = Game(initial_stations=False, **game_options)
+    lines = None
+    state = None
+    cargo_data = {}  # handle -> (type, spawn tick, expiry tick)
+    for kind, payload in read_records(buffer):
+        if kind == STATIONS:
+            xs, offset = unpack_array("d", payload, 0)
+            ys, offset = unpack_array("d", payload, offset)
+            types, offset = unpack_array("B", payload, offset)
+            for x, y, cargo_type in zip(xs, ys, types):
+                # stations placed by the game have integer positions, keep them integers
+                x = int(x) if x.is_integer() else x
+                y = int(y) if y.is_integer() else y
+                game.add_station(Station(x, y, cargo_type, game.versions))
+        elif kind == LINES:
+            lines = payload
+        elif kind == CARGO:
+            handles, offset = unpack_array("q", payload, 0)
+            types, offset = unpack_array("B", payload, offset)
+            spawns, offset = unpack_array("q", payload, offset)
+            expiries, offset = unpack_array("q", payload, offset)
+            cargo_data.update(zip(handles, zip(types, spawns, expiries)))
+        elif kind == STATE:
+            state = payload
+    if lines is None or state is None:
+        raise ValueError("the snapshot holds no complete save")
+
+    restore_lines(game, lines)
+    restore_state(game, state, cargo_data)
+    return game
+
+
+def restore_lines(game, payload):
+    """
+    Rebuilds station lists, tracks, histograms and bitmasks of all lines
+    :return: None
+    """
+    counts, offset = unpack_array("I", payload, 0)
+    indices, offset = unpack_array("I", payload, offset)
+    position = 0
+    for line, count in zip(game.lines, counts):
+        line.stations = [game.stations[i] for i in indices[position:position + count]]
+        position += count
+        line.tracks = list(zip(line.stations, line.stations[1:]))
+        for station in line.stations:
+            station.attached_lines.add(line)
+            line.count_station(station, 1)  # the closing station of a loop counts twice, as when it was built
+    # the masks of a station combine all its lines, so they are only updated once every line is complete
+    for line in game.lines:
+        line.topology_changed()
+
+
+def restore_state(game, payload, cargo_data):
+    """
+    Restores money, score and ticks, places the waiting cargo and puts the trains back on their lines
+    :return: None
+    """
+    game.tick_counter, game.money, game.score, game_over, next_handle = GAME_STATE.unpack_from(payload, 0)
+    game.game_over = bool(game_over)
+    offset = GAME_STATE.size
+    possible_types, offset = unpack_array("B", payload, offset)
+    available_stations, offset = unpack_array("B", payload, offset)
+    arrivals, offset = unpack_array("I", payload, offset)
+    waiting_counts, offset = unpack_array("I", payload, offset)
+    waiting_arrivals, offset = unpack_array("I", payload, offset)
+    waiting_handles, offset = unpack_array("q", payload, offset)
+    train_lines, offset = unpack_array("B", payload, offset)
+    train_indices, offset = unpack_array("i", payload, offset)
+    train_directions, offset = unpack_array("b", payload, offset)
+    train_progress, offset = unpack_array("d", payload, offset)
+    train_waits, offset = unpack_array("i", payload, offset)
+    train_loads, offset = unpack_array("B", payload, offset)
+    train_handles, offset = unpack_array("q", payload, offset)
+    game.seed, rng_version, gauss_next = RNG_STATE.unpack_from(payload, offset)
+    rng_words, offset = unpack_array("I", payload, offset + RNG_STATE.size)
+    deliveries, offset = unpack_array("q", payload, offset)
+    game.rng.setstate((rng_version, tuple(rng_words), None if math.isnan(gauss_next) else gauss_next))
+    game.possible_types = list(possible_types)
+    game.available_stations = list(available_stations)
+    game.deliveries = list(deliveries)
+
+    registry = game.cargos
+
+    def restore_cargo(handle, owner):
+        cargo_type, spawn_tick, expiry_tick = cargo_data[handle]
+        cargo = Cargo(cargo_type, owner, spawn_tick)
+        cargo.expiry_tick = expiry_tick
+        registry.restore(cargo, handle)
+        return cargo
+
+    position = 0
+    for station, station_arrivals, count in zip(game.stations, arrivals, waiting_counts):
+        station.arrivals = station_arrivals
+        station.cargo_count = count
+        for arrival, handle in zip(waiting_arrivals[position:position + count],
+                                   waiting_handles[position:position + count]):
+            cargo = restore_cargo(handle, station)
+            queue = station.cargo_queues.get(cargo.cargo_type)
+            if queue is None:
+                queue = station.cargo_queues[cargo.cargo_type] = deque()
+            queue.append((arrival, cargo))
+        position += count
+
+    position = 0
+    for line_id, index, direction, progress, wait_timer, load in zip(
+            train_lines, train_indices, train_directions, train_progress, train_waits, train_loads):
+        line = game.lines[line_id]
+        train = Train(line, None, game.cargo_delivered)
+        train.current_station_index = index
+        train.direction = direction
+        train.progress = progress
+        train.wait_timer = wait_timer
+        for handle in train_handles[position:position + load]:
+            train.cargo_load.append(restore_cargo(handle, train))
+        position += load
+        line.trains.append(train)
+        game.trains.append(train)
+
+    registry.next_handle = next_handle
+    game.cargo_deadlines = [(cargo.expiry_tick, cargo.handle, cargo) for cargo in registry]
+    heapq.heapify(game.cargo_deadlines)
+    if game.train_batch is not None:
+        game.train_batch.trains_changed()
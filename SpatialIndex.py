@@ -0,0 +1,219 @@
+import math
+
+import Constants
+
+
+class StationGrid:
+    """
+    Uniform grid over the station positions, used for click hit-testing and station placement.
+    With cells as large as a station's diameter a radius query only has to look at a few cells,
+    so point and collision queries take O(1) expected time regardless of the number of stations.
+    """
+    def __init__(self, cell_size=2 * Constants.UI_STATION_RADIUS):
+        """
+        Constructor
+        :param cell_size: int - edge length of a grid cell
+        """
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], list['Station']] = {}
+
+    def cell_of(self, x, y):
+        """
+        Returns the cell coordinates containing the given position
+        """
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def add(self, station):
+        """
+        Inserts a station at its position
+        :param station: Station
+        :return: None
+        """
+        self.cells.setdefault(self.cell_of(*station.position), []).append(station)
+
+    def query_rect(self, x1, y1, x2, y2):
+        """
+        Yields all stations whose center lies inside the given rectangle
+        :return: generator of Station
+        """
+        for station in self.cells_in_rect(x1, y1, x2, y2):
+            x, y = station.position
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                yield station
+
+    def cells_in_rect(self, x1, y1, x2, y2):
+        """
+        Yields the stations of all cells overlapping the given rectangle.
+        Walks the occupied cells instead when the rectangle spans more cells than there are occupied ones.
+        :return: generator of Station
+        """
+        cx1, cy1 = self.cell_of(x1, y1)
+        cx2, cy2 = self.cell_of(x2, y2)
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(self.cells):
+            for (cx, cy), stations in self.cells.items():
+                if cx1 <= cx <= cx2 and cy1 <= cy <= cy2:
+                    yield from stations
+            return
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                yield from self.cells.get((cx, cy), ())
+
+    def query_radius(self, x, y, radius):
+        """
+        Yields all stations whose center is within the radius of the given position
+        :return: generator of Station
+        """
+        for station in self.query_rect(x - radius, y - radius, x + radius, y + radius):
+            if math.dist(station.position, (x, y)) <= radius:
+                yield station
+
+    def query_point(self, x, y, radius=Constants.UI_STATION_RADIUS):
+        """
+        Returns the station closest to the given position if it is within the station radius
+        :return: Station or None
+        """
+        best = None
+        best_distance = None
+        for station in self.query_radius(x, y, radius):
+            distance = math.dist(station.position, (x, y))
+            if best is None or distance < best_distance:
+                best = station
+                best_distance = distance
+        return best
+
+    def nearest_distance(self, x, y, max_distance):
+        """
+        Distance from the given position to the closest station, capped at max_distance
+        :return: float
+        """
+        nearest = max_distance
+        for station in self.query_rect(x - max_distance, y - max_distance, x + max_distance, y + max_distance):
+            nearest = min(nearest, math.dist(station.position, (x, y)))
+        return nearest
+
+
+class TrackIndex:
+    """
+    Uniform grid over the track segments of all lines, used to pick the track under the cursor.
+    Every segment is stored in all cells it passes through. A line's segments are re-inserted
+    lazily when its topology version changed, all other lines stay untouched.
+    """
+    def __init__(self, lines, cell_size=2 * Constants.UI_STATION_RADIUS):
+        """
+        Constructor
+        :param lines: list[Line] - lines of the main game
+        :param cell_size: int - edge length of a grid cell
+        """
+        self.lines = lines
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], list[tuple['Line', int, tuple]]] = {}
+        self.line_cells: dict['Line', set[tuple[int, int]]] = {}  # line -> cells holding its segments
+        self.indexed_versions: dict['Line', int] = {}
+
+    def cell_of(self, x, y):
+        """
+        Returns the cell coordinates containing the given position
+        """
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def update(self):
+        """
+        Re-inserts the segments of every line whose topology changed since it was indexed
+        :return: None
+        """
+        for line in self.lines:
+            if self.indexed_versions.get(line) != line.topology_version:
+                self.remove_line(line)
+                for track_index, (start, end) in enumerate(line.tracks):
+                    self.add_segment(line, track_index, start.position + end.position)
+                self.indexed_versions[line] = line.topology_version
+
+    def remove_line(self, line):
+        """
+        Drops all segments of the given line from the grid
+        :return: None
+        """
+        for cell in self.line_cells.pop(line, ()):
+            entries = [entry for entry in self.cells[cell] if entry[0] is not line]
+            if entries:
+                self.cells[cell] = entries
+            else:
+                del self.cells[cell]
+
+    def add_segment(self, line, track_index, segment):
+        """
+        Stores a segment in every cell it passes through
+        :param line: Line - owner of the track
+        :param track_index: int - index of the track in line.tracks
+        :param segment: tuple - x1, y1, x2, y2
+        :return: None
+        """
+        x1, y1, x2, y2 = segment
+        cx1, cy1 = self.cell_of(min(x1, x2), min(y1, y2))
+        cx2, cy2 = self.cell_of(max(x1, x2), max(y1, y2))
+        half_diagonal = self.cell_size * math.sqrt(2) / 2
+        cells = self.line_cells.setdefault(line, set())
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                center = ((cx + 0.5) * self.cell_size, (cy + 0.5) * self.cell_size)
+                if point_segment_distance(center, segment) <= half_diagonal:
+                    self.cells.setdefault((cx, cy), []).append((line, track_index, segment))
+                    cells.add((cx, cy))
+
+    def query_rect(self, x1, y1, x2, y2):
+        """
+        Returns all tracks with a segment passing through a grid cell overlapping the given rectangle
+        :return: dict[tuple[Line, int], tuple] - (line, track index) -> segment
+        """
+        self.update()
+        tracks = {}
+        cx1, cy1 = self.cell_of(x1, y1)
+        cx2, cy2 = self.cell_of(x2, y2)
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(self.cells):
+            cells = (entries for (cx, cy), entries in self.cells.items() if cx1 <= cx <= cx2 and cy1 <= cy <= cy2)
+        else:
+            cells = (self.cells.get((cx, cy), ()) for cx in range(cx1, cx2 + 1) for cy in range(cy1, cy2 + 1))
+        for entries in cells:
+            for line, track_index, segment in entries:
+                tracks[line, track_index] = segment
+        return tracks
+
+    def nearest(self, x, y, tolerance):
+        """
+        Returns the track closest to the given position within the pick tolerance
+        :param x: x position
+        :param y: y position
+        :param tolerance: float - maximal distance between position and track
+        :return: tuple[Line, int] or None
+        """
+        self.update()
+        best = None
+        best_distance = tolerance
+        cx1, cy1 = self.cell_of(x - tolerance, y - tolerance)
+        cx2, cy2 = self.cell_of(x + tolerance, y + tolerance)
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                for line, track_index, segment in self.cells.get((cx, cy), ()):
+                    distance = point_segment_distance((x, y), segment)
+                    if distance <= best_distance:
+                        best = (line, track_index)
+                        best_distance = distance
+        return best
+
+
+def point_segment_distance(point, segment):
+    """
+    Distance between a point and a line segment
+    :param point: tuple - x, y
+    :param segment: tuple - x1, y1, x2, y2
+    :return: float
+    """
+    px, py = point
+    x1, y1, x2, y2 = segment
+    dx = x2 - x1
+    dy = y2 - y1
+    length_squared = dx * dx + dy * dy
+    if length_squared == 0:
+        return math.dist(point, (x1, y1))
+    t = max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length_squared))
+    return math.dist(point, (x1 + t * dx, y1 + t * dy))
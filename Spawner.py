@@ -0,0 +1,83 @@
+import random
+
+
+class CargoSpawner:
+    """
+    Picks the cargo type of newly spawned cargo.
+    Keeps a live histogram of the station types on the field, so a type can be drawn
+    "any type except the spawning station's own, weighted by the number of stations of that type"
+    without building a list of all other stations.
+    """
+    def __init__(self, rng=random):
+        """
+        Constructor
+        :param rng: random number generator with a randrange method (the random module by default)
+        """
+        self.rng = rng
+        self.type_counts: dict[int, int] = {}  # cargo type -> number of stations of that type
+        self.station_count = 0
+
+    def add_station(self, station):
+        """
+        Counts a new station in the type histogram
+        :param station: Station - newly created station
+        :return: None
+        """
+        self.type_counts[station.cargo_type] = self.type_counts.get(station.cargo_type, 0) + 1
+        self.station_count += 1
+
+    def sample(self, excluded_type):
+        """
+        Draws a cargo type with the same distribution as choice() over the types of all stations
+        that are not of the excluded type, using a single random draw over the cumulative counts
+        :param excluded_type: int - cargo type of the spawning station
+        :return: int or None if every station has the excluded type
+        """
+        total = self.station_count - self.type_counts.get(excluded_type, 0)
+        if total <= 0:
+            return None
+        r = self.rng.randrange(total)
+        for cargo_type, count in self.type_counts.items():
+            if cargo_type == excluded_type:
+                continue
+            if r < count:
+                return cargo_type
+            r -= count
+        return None
+
+
+class SpawnSchedule:
+    """
+    Spreads the cargo spawns of all stations over the spawn period.
+    Every station gets a fixed phase offset and spawns whenever tick % period equals its phase,
+    so each station still spawns once per period, but not all of them on the same tick.
+    Phases follow the golden ratio sequence, which stays evenly spread for any number of stations.
+    """
+    GOLDEN_RATIO_FRACTION = 0.6180339887498949
+
+    def __init__(self, period):
+        """
+        Constructor
+        :param period: int - ticks between two spawns of the same station
+        """
+        self.period = period
+        self.buckets: dict[int, list['Station']] = {}  # phase -> stations spawning at that phase
+        self.station_count = 0
+
+    def add_station(self, station):
+        """
+        Assigns the next phase offset to a new station
+        :param station: Station - newly created station
+        :return: None
+        """
+        phase = int(self.station_count * self.GOLDEN_RATIO_FRACTION % 1.0 * self.period)
+        self.buckets.setdefault(phase, []).append(station)
+        self.station_count += 1
+
+    def due(self, tick_counter):
+        """
+        Returns the stations that spawn cargo on the given tick
+        :param tick_counter: int - current tick of the main game
+        :return: list[Station]
+        """
+        return self.buckets.get(tick_counter % self.period, [])
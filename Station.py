@@ -1,22 +1,32 @@
 import Constants
 import math
+import heapq
+from collections import deque
+from LayerVersions import LayerVersions
 
 class Station:
     """
     Represents a station element that can be attached to a line
     Trains can load or unload cargo here to progress the game.
     """
-    def __init__(self, x_pos, y_pos, cargo_type):
+    def __init__(self, x_pos, y_pos, cargo_type, versions=None):
         """
         Constructor
         :param x_pos: int - x position on playing field
         :param y_pos: int - y position on playing field
         :param cargo_type: int - type of the cargo to be deployed here
+        :param versions: LayerVersions - render layer counters of the main game
         """
+        self.id = None  # index in the station list of the main game, set when the station is placed
         self.position = (x_pos, y_pos)
         self.cargo_type = cargo_type
         self.attached_lines = set()
-        self.cargo_load = []
+        self.connected_mask = 0  # bit n is set if an attached line services cargo type n
+        self.cargo_queues: dict[int, deque] = {}  # cargo type -> FIFO of (arrival number, cargo)
+        self.cargo_count = 0
+        self.arrivals = 0
+        self.ordered_cargo = None  # cached arrival-ordered view, rebuilt after changes
+        self.versions = versions if versions is not None else LayerVersions()
 
 
     def is_clicked(self, x, y):
@@ -30,19 +40,51 @@ class Station:
         return distance <= Constants.UI_STATION_RADIUS
 
 
+    @property
+    def cargo_load(self):
+        """
+        All cargo waiting at this station in arrival order (used to draw the cargo grid)
+        :return: list[Cargo]
+        """
+        if self.ordered_cargo is None:
+            self.ordered_cargo = [c for _, c in heapq.merge(*self.cargo_queues.values())]
+        return self.ordered_cargo
+
     def add_cargo(self, cargo):
         """
         Adds a cargo item to the station's load.
         """
-        self.cargo_load.append(cargo)
+        queue = self.cargo_queues.get(cargo.cargo_type)
+        if queue is None:
+            queue = self.cargo_queues[cargo.cargo_type] = deque()
+        queue.append((self.arrivals, cargo))
+        self.arrivals += 1
+        self.cargo_count += 1
+        self.ordered_cargo = None
+        self.versions.semi_static += 1
 
     def get_cargo(self):
         """
         Removes and returns the first cargo item from the station's load.
         """
-        if self.cargo_load:
-            return self.cargo_load.pop(0)
-        return None
+        return self.pop_oldest(-1)
+
+    def pop_oldest(self, type_mask):
+        """
+        Removes and returns the cargo that waits longest among the given types
+        :param type_mask: int - bitmask with bit n set for every accepted cargo type n
+        :return: Cargo or None if no cargo of these types is waiting
+        """
+        oldest = None
+        for cargo_type, queue in self.cargo_queues.items():
+            if queue and type_mask >> cargo_type & 1 and (oldest is None or queue[0][0] < oldest[0][0]):
+                oldest = queue
+        if oldest is None:
+            return None
+        self.cargo_count -= 1
+        self.ordered_cargo = None
+        self.versions.semi_static += 1
+        return oldest.popleft()[1]
 
     def get_distance_to(self, other_station):
         """
@@ -60,7 +102,14 @@ class Station:
         :param cargo_type: int - id of the cargo type to check for
         :return: Bool
         """
+        return self.connected_mask >> cargo_type & 1 == 1
+
+    def update_connected_mask(self):
+        """
+        Recombines the type bitmasks of all attached lines, called by a line after its topology changed
+        :return: None
+        """
+        mask = 0
         for lin in self.attached_lines:
-            if lin.can_deploy_type(cargo_type):
-                return True
-        return False
+            mask |= lin.type_mask
+        self.connected_mask = mask
@@ -0,0 +1,98 @@
+"""
+Scripted build strategies playing the game without a player, used by batch runs
+A strategy is asked to act every STRATEGY_TICKS ticks and builds through the same Game methods as the UI.
+"""
+import Constants
+
+
+class Strategy:
+    """
+    Base strategy, never builds anything (baseline for how long the stations survive on their own)
+    """
+    name = "idle"
+
+    def __init__(self, game):
+        """
+        Constructor
+        :param game: Game - game to play
+        """
+        self.game = game
+
+    def act(self):
+        """
+        Performs the build actions for the current game state
+        :return: None
+        """
+        pass
+
+    def unconnected_stations(self):
+        return [station for station in self.game.stations if not any(station in line.stations for line in self.game.lines)]
+
+    def build(self, line, start_station, end_station):
+        """
+        Buys a track from start_station to end_station on the line
+        :return: bool - False if the money was not enough
+        """
+        money = self.game.money
+        self.game.buy_line(line, start_station, end_station)
+        return self.game.money != money
+
+    def buy_trains(self):
+        """
+        Buys trains for built lines while money allows, the line with the fewest trains first
+        :return: None
+        """
+        game = self.game
+        while game.money >= Constants.COST_PER_TRAIN:
+            lines = [line for line in game.lines
+                     if len(line.stations) >= 2 and len(line.trains) <= Constants.MAX_TRAINS_PER_LINE]
+            if not lines:
+                return
+            line = min(lines, key=lambda l: len(l.trains))
+            game.buy_train(line, line.stations[0])
+
+
+class ChainStrategy(Strategy):
+    """
+    Builds a single line, always extending its end to the closest unconnected station
+    """
+    name = "chain"
+
+    def act(self):
+        line = self.game.lines[0]
+        while True:
+            unconnected = self.unconnected_stations()
+            if not unconnected or (not line.stations and len(unconnected) < 2):
+                break
+            start = line.stations[-1] if line.stations else unconnected.pop(0)
+            if not self.build(line, start, min(unconnected, key=start.get_distance_to)):
+                break
+        self.buy_trains()
+
+
+class NearestEndStrategy(Strategy):
+    """
+    Connects every new station to the closest end of any line, starting unused lines first
+    """
+    name = "nearest"
+
+    def act(self):
+        game = self.game
+        for station in self.unconnected_stations():
+            others = [other for other in game.stations if other is not station]
+            empty = next((line for line in game.lines if not line.stations), None)
+            if empty is not None:
+                if others and not self.build(empty, station, min(others, key=station.get_distance_to)):
+                    break
+                continue
+            ends = [(line, end) for line in game.lines if not line.is_loop()
+                    for end in (line.stations[0], line.stations[-1])]
+            if not ends:
+                break
+            line, end = min(ends, key=lambda pair: station.get_distance_to(pair[1]))
+            if not self.build(line, end, station):
+                break
+        self.buy_trains()
+
+
+STRATEGIES = {strategy.name: strategy for strategy in (Strategy, ChainStrategy, NearestEndStrategy)}
@@ -1,5 +1,4 @@
 import Constants
-import math
 
 class Train:
     """
@@ -29,11 +28,27 @@ class Train:
             self.direction = 1
         self.progress = 0.0 
         self.wait_timer = 0
+        self.previous_position = None
+        self.cached_position = None  # position memoized until the next update or topology change
+        self.batch = None  # TrainBatch owning the movement state when batched movement is enabled
+        self.slot = None
+        self.synced_generation = None
 
     @property
     def position(self):
         """
         Calculates the x, y position of the train on the track.
+        Computed once per tick and cached until the next update.
+        """
+        if self.batch is not None:
+            self.batch.sync_train(self)
+        if self.cached_position is None:
+            self.cached_position = self.calculate_position()
+        return self.cached_position
+
+    def calculate_position(self):
+        """
+        Interpolates the x, y position along the current track using the line's cached geometry
         """
         # catch some bugs
         if not self.line.stations:
@@ -44,23 +59,25 @@ class Train:
             return self.line.stations[self.current_station_index].position
 
         # when on the road
-        start_station_index = self.current_station_index
-        end_station_index = self.current_station_index + self.direction
-
-        try:
-            start_station = self.line.stations[start_station_index]
-            end_station = self.line.stations[end_station_index]
-        except IndexError:
+        segment = self.line.segment(self.current_station_index, self.direction)
+        if segment is None:
             # At the end of the line, return the last station's position
-            return self.line.stations[start_station_index].position
+            return self.line.stations[self.current_station_index].position
 
-        x1, y1 = start_station.position
-        x2, y2 = end_station.position
-        
-        x = x1 + (x2 - x1) * self.progress
-        y = y1 + (y2 - y1) * self.progress
-        
-        return x, y
+        x1, y1 = self.line.stations[self.current_station_index].position
+        return x1 + segment[2] * self.progress, y1 + segment[3] * self.progress
+
+    def render_position(self, alpha):
+        """
+        Interpolates between the position before and after the last tick
+        :param alpha: float - fraction of a tick elapsed since the last update (0.0 to 1.0)
+        :return: tuple[float, float] - x, y position to draw the train at
+        """
+        x2, y2 = self.position
+        if self.previous_position is None:
+            return x2, y2
+        x1, y1 = self.previous_position
+        return x1 + (x2 - x1) * alpha, y1 + (y2 - y1) * alpha
 
     def moving_towards(self, cargo_type):
         """
@@ -68,40 +85,16 @@ class Train:
         :param cargo_type: int - Cargo type
         :return: Bool
         """
-        # if in a loop
-        if self.line.stations[0] == self.line.stations[-1]:
-            for sta in self.line.stations:
-                if cargo_type == sta.cargo_type:
-                    return True
-                if not self.line.can_deploy_type(cargo_type) and\
-                not self.line.stations[self.current_station_index].is_connected_to_cargo_type(cargo_type):
-                    for ln in sta.attached_lines:
-                        if ln.can_deploy_type(cargo_type):
-                            return True
-            return False
-        # if no loop
-        else:
-            sta_lst = []
-            if self.direction == 1:
-                sta_lst.extend(self.line.stations[self.current_station_index+1:])
-            else:
-                sta_lst.extend(self.line.stations[:self.current_station_index])
-            #print([Constants.CARGO_TYPE_NAMES[st.cargo_type] for st in sta_lst])
-            for sta in sta_lst:
-                if sta.cargo_type == cargo_type:
-                    return True
-                elif not self.line.can_deploy_type(cargo_type) and\
-                not self.line.stations[self.current_station_index].is_connected_to_cargo_type(cargo_type):
-                    for ln in sta.attached_lines:
-                        if ln.can_deploy_type(cargo_type):
-                            return True
-            return False
+        return self.line.deliverable_types(self.current_station_index, self.direction) >> cargo_type & 1 == 1
 
     def update(self, tick_counter):
         """
         Updates the train's progress on the line
         and handles loading and unloading the train
         """
+        self.previous_position = self.position
+        self.cached_position = None
+
         # during stop
         if self.wait_timer > 0:
             self.wait_timer -= 1
@@ -123,16 +116,11 @@ class Train:
                         station.add_cargo(cargo_to_unload)
                     self.trigger_score(cargo_to_unload.cargo_type)
                 # Loading
-                elif station.cargo_load and len(self.cargo_load) < Constants.CARGO_SPOTS_PER_TROLLEY:
-                    index = next(
-                        (station.cargo_load.index(c)
-                         for c in station.cargo_load
-                         if self.moving_towards(c.cargo_type)), -1
-                    )
-                    if index != -1:
-                        cargo_to_load = station.cargo_load[index]
+                elif station.cargo_count and len(self.cargo_load) < Constants.CARGO_SPOTS_PER_TROLLEY:
+                    cargo_to_load = station.pop_oldest(
+                        self.line.deliverable_types(self.current_station_index, self.direction))
+                    if cargo_to_load is not None:
                         self.add_cargo(cargo_to_load)
-                        del station.cargo_load[index]
 
             return
 
@@ -140,45 +128,43 @@ class Train:
         if not self.line.stations or len(self.line.stations) < 2:
             return
 
-        try:
-            start_station = self.line.stations[self.current_station_index]
-            end_station = self.line.stations[self.current_station_index + self.direction]
-
-            x1, y1 = start_station.position
-            x2, y2 = end_station.position
-
-            distance = math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
-
-            if distance > 0:
-                self.progress += Constants.TRAIN_SPEED / distance
-            else:
-                self.progress = 1.0
-        except IndexError:
-            # At the end of the line, just arrive instantly
+        segment = self.line.segment(self.current_station_index, self.direction)
+        if segment is not None and segment[0] > 0:
+            self.progress += Constants.TRAIN_SPEED * segment[1]
+        else:
+            # At the end of the line or on a zero length track, just arrive instantly
             self.progress = 1.0
 
+        # Arrived at new station
+        if self.progress >= 1.0:
+            self.arrive()
+
+    def arrive(self):
+        """
+        Moves the train onto the station at the end of its current track
+        and starts the stop, flipping or wrapping the direction at the end of the line
+        :return: None
+        """
         is_loop = self.line.is_loop()
         num_stations = len(self.line.stations)
 
-        # Arrived at new station
-        if self.progress >= 1.0:
-            self.progress = 0.0
-            # First, update index to mark arrival at the new station
-            self.current_station_index += self.direction
-            self.wait_timer = Constants.CARGO_DEPLOY_TIME * Constants.CARGO_SPOTS_PER_TROLLEY * 2
-
-            if not is_loop:
-                # Then, check for direction flip
-                if self.current_station_index >= num_stations - 1 and self.direction == 1:
-                    self.direction = -1
-                elif self.current_station_index <= 0 and self.direction == -1:
-                    self.direction = 1
-            else:
-                # It's a loop, wrap around
-                if self.current_station_index >= num_stations - 1 and self.direction > 0:
-                    self.current_station_index = 0
-                elif self.current_station_index <= -1 and is_loop and self.direction < 0:
-                    self.current_station_index = len(self.line.stations) - 1
+        self.progress = 0.0
+        # First, update index to mark arrival at the new station
+        self.current_station_index += self.direction
+        self.wait_timer = Constants.CARGO_DEPLOY_TIME * Constants.CARGO_SPOTS_PER_TROLLEY * 2
+
+        if not is_loop:
+            # Then, check for direction flip
+            if self.current_station_index >= num_stations - 1 and self.direction == 1:
+                self.direction = -1
+            elif self.current_station_index <= 0 and self.direction == -1:
+                self.direction = 1
+        else:
+            # It's a loop, wrap around
+            if self.current_station_index >= num_stations - 1 and self.direction > 0:
+                self.current_station_index = 0
+            elif self.current_station_index <= -1 and is_loop and self.direction < 0:
+                self.current_station_index = len(self.line.stations) - 1
 
     def add_cargo(self, cargo):
         """
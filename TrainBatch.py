@@ -0,0 +1,192 @@
+import numpy as np
+
+import Constants
+
+
+class TrainBatch:
+    """
+    Optional batched movement stage for all trains of the main game (requires numpy).
+    Keeps segment index, direction, progress, wait timer and the cached step per tick of every train
+    in arrays and advances all driving trains in one vectorized step.
+    Only trains that are handling cargo at a station or arrive at one this tick run the per-train python code,
+    on ticks without cargo handling the stop timers are counted down in the arrays as well.
+    While batched, progress and wait timer live in the arrays; the train object
+    is brought up to date lazily by sync_train when its position is read.
+    """
+    def __init__(self, lines):
+        """
+        Constructor
+        :param lines: list[Line] - lines of the main game, their trains are batched in line order
+        """
+        self.lines = lines
+        self.trains: list['Train'] = []
+        self.layout_key = None
+        self.generation = 0
+        self.allocate(0)
+
+    def allocate(self, size):
+        """
+        Creates the state arrays for the given number of trains
+        :param size: int
+        :return: None
+        """
+        self.index = np.zeros(size, dtype=np.int64)
+        self.direction = np.zeros(size, dtype=np.int64)
+        self.wait = np.zeros(size, dtype=np.int64)
+        self.progress = np.zeros(size, dtype=np.float64)
+        self.step = np.zeros(size, dtype=np.float64)  # progress gained per tick on the current track
+        self.start_x = np.zeros(size, dtype=np.float64)
+        self.start_y = np.zeros(size, dtype=np.float64)
+        self.dx = np.zeros(size, dtype=np.float64)
+        self.dy = np.zeros(size, dtype=np.float64)
+        self.x = np.zeros(size, dtype=np.float64)
+        self.y = np.zeros(size, dtype=np.float64)
+        self.previous_x = np.zeros(size, dtype=np.float64)
+        self.previous_y = np.zeros(size, dtype=np.float64)
+
+    def trains_changed(self):
+        """
+        Called by the main game when trains are added, forces a rebuild before the next use
+        (removing trains always comes with a topology change)
+        :return: None
+        """
+        self.layout_key = None
+
+    def ensure_current(self):
+        """
+        Rebuilds the arrays if trains were added or any line topology changed since the last rebuild
+        :return: None
+        """
+        key = self.lines[0].versions.static if self.lines else 0
+        if key != self.layout_key:
+            self.layout_key = key
+            self.rebuild()
+
+    def rebuild(self):
+        """
+        Writes the batched state back into the old trains and reloads the state of all current trains
+        :return: None
+        """
+        for train in self.trains:
+            if train.synced_generation != self.generation:
+                self.write_back(train)
+            train.cached_position = None  # the topology may have changed, recompute from the python state
+            train.batch = None
+
+        self.trains = [train for line in self.lines for train in line.trains]
+        self.allocate(len(self.trains))
+        for slot, train in enumerate(self.trains):
+            self.load_train(slot, train)
+            if train.previous_position is not None:
+                self.previous_x[slot], self.previous_y[slot] = train.previous_position
+            else:
+                self.previous_x[slot], self.previous_y[slot] = self.x[slot], self.y[slot]
+            train.batch = self
+            train.slot = slot
+            train.synced_generation = self.generation
+
+    def load_train(self, slot, train):
+        """
+        Copies the python state of a single train into the arrays
+        :param slot: int - array index of the train
+        :param train: Train
+        :return: None
+        """
+        self.index[slot] = train.current_station_index
+        self.direction[slot] = train.direction
+        self.wait[slot] = train.wait_timer
+        self.progress[slot] = train.progress
+        self.x[slot], self.y[slot] = train.position
+
+        stations = train.line.stations
+        segment = train.line.segment(train.current_station_index, train.direction)
+        if len(stations) < 2:
+            # not driving at all
+            step, dx, dy = 0.0, 0.0, 0.0
+        elif segment is None or segment[0] <= 0:
+            # end of the line or zero length track, arrive instantly
+            step, dx, dy = 1.0, 0.0, 0.0
+        else:
+            step, dx, dy = Constants.TRAIN_SPEED * segment[1], segment[2], segment[3]
+        self.step[slot] = step
+        self.dx[slot] = dx
+        self.dy[slot] = dy
+        if stations and 0 <= train.current_station_index < len(stations):
+            self.start_x[slot], self.start_y[slot] = stations[train.current_station_index].position
+        else:
+            self.start_x[slot], self.start_y[slot] = self.x[slot], self.y[slot]
+
+    def sync_train(self, train):
+        """
+        Brings progress and positions of a batched train object up to date with the arrays
+        :param train: Train - train of this batch
+        :return: None
+        """
+        self.ensure_current()
+        if train.batch is self and train.synced_generation != self.generation:
+            self.write_back(train)
+
+    def write_back(self, train):
+        """
+        Copies the array state of a batched train into the train object
+        :param train: Train - train of this batch
+        :return: None
+        """
+        slot = train.slot
+        train.synced_generation = self.generation
+        train.progress = float(self.progress[slot])
+        train.wait_timer = int(self.wait[slot])
+        train.previous_position = (float(self.previous_x[slot]), float(self.previous_y[slot]))
+        train.cached_position = (float(self.x[slot]), float(self.y[slot]))
+
+    def sync_all(self):
+        """
+        Brings every batched train object up to date, e.g. before saving the game state
+        :return: None
+        """
+        for train in self.trains:
+            self.sync_train(train)
+
+    def tick(self, tick_counter):
+        """
+        Advances all trains by one tick, equivalent to calling Line.tick on every line
+        :param tick_counter: int
+        :return: None
+        """
+        self.ensure_current()
+        self.generation += 1
+        np.copyto(self.previous_x, self.x)
+        np.copyto(self.previous_y, self.y)
+
+        standing = self.wait > 0
+        driving = ~standing
+
+        # Vectorized driving step, standing trains have progress 0 and stay at their start station
+        self.progress += np.where(driving, self.step, 0.0)
+        np.multiply(self.dx, self.progress, out=self.x)
+        self.x += self.start_x
+        np.multiply(self.dy, self.progress, out=self.y)
+        self.y += self.start_y
+        arriving = np.flatnonzero(driving & (self.progress >= 1.0))
+
+        if tick_counter % Constants.CARGO_DEPLOY_TIME == 0:
+            # Per-train python for trains handling cargo at a station, in line order
+            for slot in np.flatnonzero(standing).tolist():
+                train = self.trains[slot]
+                if train.synced_generation != self.generation:
+                    self.write_back(train)
+                train.update(tick_counter)
+                self.wait[slot] = train.wait_timer
+        else:
+            # Standing trains only count down their stop
+            self.wait -= standing
+
+        # Per-train python for arrivals
+        for slot in arriving.tolist():
+            train = self.trains[slot]
+            if train.synced_generation != self.generation:
+                self.write_back(train)
+            train.previous_position = (float(self.previous_x[slot]), float(self.previous_y[slot]))
+            train.arrive()
+            train.cached_position = None
+            self.load_train(slot, train)
@@ -2,18 +2,22 @@ import tkinter as tk
 
 import Constants
 from Station import Station
+from Renderer import CanvasRenderer
+from Camera import Camera
+from Assets import SpriteCache, SpriteSet
 
 
 class TrainspottingAppUI:
     """
     UI class to manage display of and interaction with the main game
     """
-    def __init__(self, master, game):
+    def __init__(self, master, game, sprites=None):
         """
         Constructor
         Initializes the main window and defines starting variables
         :param master: tk
         :param game: main game instance
+        :param sprites: SpriteCache - loads the scaled images, a disk backed cache if not given
         """
         self.master = master
         self.master.title("Trainspotting")
@@ -24,19 +28,12 @@ class TrainspottingAppUI:
         self.cursor_pos = ()
         self.building_line = None
         self.game_over_screen_shown = False
-        self.cargo_images = {}
-        self.cargo_images_small = {}
-        for cargo_type, image_path in Constants.CARGO_TYPE_TO_IMAGE.items():
-            image = tk.PhotoImage(file=image_path)
-            self.cargo_images[cargo_type] = image.subsample(24)
-            self.cargo_images_small[cargo_type] = image.subsample(32)
-        self.train_image = tk.PhotoImage(file="img/chocho.png").subsample(6)
-        self.train_images = {
-            "red": tk.PhotoImage(file="img/chocho_red.png").subsample(6),
-            "blue": tk.PhotoImage(file="img/chocho_blue.png").subsample(6),
-            "yellow": tk.PhotoImage(file="img/chocho_yellow.png").subsample(6),
-        }
-        self.daisy_image = tk.PhotoImage(file=Constants.DAISY_PATH).subsample(2)
+        # Sprites are loaded on first use
+        self.sprites = sprites if sprites is not None else SpriteCache()
+        self.cargo_images = SpriteSet(self.sprites, Constants.CARGO_TYPE_TO_IMAGE, 24)
+        self.cargo_images_small = SpriteSet(self.sprites, Constants.CARGO_TYPE_TO_IMAGE, 32)
+        self.train_images = SpriteSet(self.sprites, Constants.LINE_COLOR_TO_TRAIN_IMAGE, 6,
+                                      fallback_path=Constants.TRAIN_IMAGE)
 
         # Main Frame
         self.main_frame = tk.Frame(master)
@@ -50,6 +47,11 @@ class TrainspottingAppUI:
             bg="whitesmoke"
         )
         self.canvas.pack(side="left", fill="both", expand=True)
+        self.camera = Camera()
+        self.pan_start = None
+        self.renderer = CanvasRenderer(
+            self.canvas, self.cargo_images_small, self.cargo_images, self.train_images, camera=self.camera
+        )
 
         # UI panel on the right
         self.ui_frame = tk.Frame(self.main_frame, width=Constants.UI_SIDEBAR_MARGIN)
@@ -58,14 +60,55 @@ class TrainspottingAppUI:
 
         tk.Label(self.ui_frame, text="UI Panel").pack(pady=(10, 0))
 
+        # Fast-forward buttons
+        self.speed_frame = tk.Frame(self.ui_frame)
+        self.speed_frame.pack(side="top", fill="x", pady=(5, 10))
+        self.speed_buttons = {}
+        for speed in Constants.GAME_SPEEDS:
+            btn = tk.Button(
+                self.speed_frame,
+                text=f"{speed}x",
+                command=lambda s=speed: self.set_speed(s)
+            )
+            btn.pack(side="left", fill="x", expand=True)
+            self.speed_buttons[speed] = btn
+        self.set_speed(self.game.speed)
+
         self.paint_field(0)
         self.canvas.bind("<Motion>",self.handle_mouse_motion)
         self.canvas.bind("<Button-1>", self.handle_left_click)
+        self.canvas.bind("<MouseWheel>", self.handle_zoom)
+        self.canvas.bind("<Button-4>", self.handle_zoom)
+        self.canvas.bind("<Button-5>", self.handle_zoom)
+        self.canvas.bind("<ButtonPress-3>", self.handle_pan_start)
+        self.canvas.bind("<B3-Motion>", self.handle_pan)
+        self.canvas.bind("<Configure>", self.handle_resize)
+
+    def present(self, fps, alpha=1.0):
+        """
+        Presentation sink entry point called by the game loop
+        :param fps: float - value shown in the TPS label
+        :param alpha: float - fraction of a tick elapsed since the last tick, used to interpolate trains
+        :return: None
+        """
+        self.paint_field(fps, alpha)
+        self.master.update()
+
+    def set_speed(self, speed):
+        """
+        Changes the fast-forward multiplier of the game loop
+        :param speed: int - one of Constants.GAME_SPEEDS
+        :return: None
+        """
+        self.game.speed = speed
+        for spd, btn in self.speed_buttons.items():
+            btn.config(relief="sunken" if spd == speed else "raised")
 
-    def paint_field(self, fps):
+    def paint_field(self, fps, alpha=1.0):
         """
         Repaints the window for every frame
-        :param fps: int - Frames per second calculated inside the game loop
+        :param fps: float - Ticks per second measured inside the game loop
+        :param alpha: float - fraction of a tick elapsed since the last tick, used to interpolate trains
         :return: None
         """
         if self.game.game_over:
@@ -73,126 +116,11 @@ class TrainspottingAppUI:
                 self.show_game_over_screen()
             return
 
-        # Clear previous frame
-        for item in self.game_entities:
-            self.canvas.delete(item)
-        self.game_entities.clear()
-
-        # Draw FPS string
-        fps_str = self.canvas.create_text(20, 20, text=f"TPS: {fps:.2f}", anchor="w")
-        self.game_entities.append(fps_str)
-
-        # Draw Score
-        score_text = self.canvas.create_text(1050, 20, text = f"Score: {self.game.score}", anchor="e")
-        self.game_entities.append(score_text)
-
-        # Draw Money
-        money_text = self.canvas.create_text(1050, 40, text=f"Money: {self.game.money:.2f}$$", anchor="e")
-        self.game_entities.append(money_text)
-
-        # Draw building info
+        building_text = None
         if self.building_line:
-            info_text = self.canvas.create_text(20, 50, text=f"Currently building line {self.building_line[0]}, Cost: {(self.building_line[1].get_distance_to(self.cursor_pos) * Constants.COST_PER_METER):.2f}$$", anchor="w")
-            self.game_entities.append(info_text)
-
-        # Draw tracks
-        line_iter = 0
-        for line in self.game.lines:
-            trk_iter = 0
-            for trk in line.tracks:
-                ln = self.canvas.create_line(
-                    trk[0].position[0], trk[0].position[1],
-                    trk[1].position[0], trk[1].position[1],
-                    fill=line.color,
-                    width=5,
-                    tags=f"{line_iter},{trk_iter}"
-                )
-                self.game_entities.append(ln)
-                if (type(self.game.selection) == tuple and
-                        trk == self.game.selection[0].tracks[self.game.selection[1]]):
-                    # selected
-                    highlight = self.canvas.create_line(
-                        trk[0].position[0], trk[0].position[1],
-                        trk[1].position[0], trk[1].position[1],
-                        fill="white",
-                        width=2
-                    )
-                    self.game_entities.append(highlight)
-                trk_iter += 1
-            line_iter += 1
-
-            # Draw stations
-            for sta in self.game.stations:
-                x, y = sta.position
-                if sta == self.game.selection:
-                    dot = self.canvas.create_oval(
-                        x - Constants.UI_STATION_RADIUS, y - Constants.UI_STATION_RADIUS,
-                        x + Constants.UI_STATION_RADIUS, y + Constants.UI_STATION_RADIUS,
-                        fill="lightgray", outline="gray", width=3
-                    )
-                else:
-                    dot = self.canvas.create_oval(
-                        x - Constants.UI_STATION_RADIUS, y - Constants.UI_STATION_RADIUS,
-                        x + Constants.UI_STATION_RADIUS, y + Constants.UI_STATION_RADIUS,
-                        fill="gray", outline="black", width=1
-                    )
-                lab = self.canvas.create_image(x, y, image=self.cargo_images[sta.cargo_type])
-                self.game_entities.append(dot)
-                self.game_entities.append(lab)
-
-                # Draw cargo (in stations)
-                for i in range(len(sta.cargo_load)):
-                    crg = sta.cargo_load[i]
-                    crg_x = x + Constants.UI_STATION_RADIUS + 20 + (i % 3) * 20
-                    crg_y = y - Constants.UI_STATION_RADIUS + (i // 3) * 20
-                    if crg.elimination_timer < 500 and (self.game.tick_counter // Constants.FLICKER_DURATION) % 2 == 0:
-                        x1 = crg_x - self.cargo_images_small[crg.cargo_type].width() // 2 - 3
-                        y1 = crg_y - self.cargo_images_small[crg.cargo_type].height() // 2 - 3
-                        x2 = crg_x + self.cargo_images_small[crg.cargo_type].width() // 2 + 4
-                        y2 = crg_y + self.cargo_images_small[crg.cargo_type].height() // 2 + 4
-                        warn = self.canvas.create_oval(
-                            x1,y1,x2,y2,
-                            fill = "red"
-                        )
-                        self.game_entities.append(warn)
-                    img = self.canvas.create_image(
-                        crg_x,
-                        crg_y,
-                        image=self.cargo_images_small[crg.cargo_type]
-                    )
-                    self.game_entities.append(img)
-
-
-        for line in self.game.lines:
-            # Draw trains
-            for trn in line.trains:
-                x, y = trn.position
-                train_img = self.train_images.get(line.color, self.train_image)
-                img = self.canvas.create_image(x, y, image=train_img)
-                self.game_entities.append(img)
-
-                # Draw Cargo (in trains)
-                for i in range(len(trn.cargo_load)):
-                    crg = trn.cargo_load[i]
-                    crg_x = x + 24 + (i % 3) * 20
-                    crg_y = y - 8 + (i // 3) * 20
-                    if crg.elimination_timer < 500 and (self.game.tick_counter // Constants.FLICKER_DURATION) % 2 == 0:
-                        x1 = crg_x - self.cargo_images_small[crg.cargo_type].width() // 2 - 3
-                        y1 = crg_y - self.cargo_images_small[crg.cargo_type].height() // 2 - 3
-                        x2 = crg_x + self.cargo_images_small[crg.cargo_type].width() // 2 + 4
-                        y2 = crg_y + self.cargo_images_small[crg.cargo_type].height() // 2 + 4
-                        warn = self.canvas.create_oval(
-                            x1,y1,x2,y2,
-                            fill = "red"
-                        )
-                        self.game_entities.append(warn)
-                    crg = trn.cargo_load[i]
-                    img = self.canvas.create_image(
-                        crg_x,
-                        crg_y,
-                        image=self.cargo_images_small[crg.cargo_type]
-                    )
-                    self.game_entities.append(img)
+            building_text = (f"Currently building line {self.building_line[0]}, "
+                             f"Cost: {(self.building_line[1].get_distance_to(self.cursor_pos) * Constants.COST_PER_METER):.2f}$$")
+        self.renderer.draw(self.game, fps, alpha, building_text)
 
     def find_track_at(self, x, y):
         """
@@ -201,18 +129,7 @@ class TrainspottingAppUI:
         :param y: y position
         :return: Tuple['Line','int'] - Line that owns given track and its index
         """
-        overlap = self.canvas.find_overlapping(x - 2, y - 2, x + 2, y + 2)
-        for item in overlap:
-            tags = self.canvas.gettags(item)
-            # print(f"Checking item with tags: {tags}")
-            try:
-                strarr = tags[0].split(",")
-                return self.game.lines[int(strarr[0])], int(strarr[1])
-            except Exception as ex:
-                # Found picture or something else
-                # print(ex)
-                continue
-        return None
+        return self.game.get_track_at(x, y, Constants.TRACK_PICK_TOLERANCE / self.camera.zoom)
 
     def draw_station_ui(self, sel):
         """
@@ -271,7 +188,7 @@ class TrainspottingAppUI:
             self.buttons.append(btn)
 
     def demolish_track(self,lin,track_id):
-        lin.demolish_track(track_id)
+        self.game.demolish_track(lin, track_id)
         self.game.selection = None
         self.selection_changed()
 
@@ -281,7 +198,8 @@ class TrainspottingAppUI:
         :param event: mouse event
         :return: None
         """
-        sel = self.game.get_clicked_station(event.x, event.y)
+        x, y = self.camera.to_world(event.x, event.y)
+        sel = self.game.get_clicked_station(x, y)
 
         if self.building_line:
             line_id, start_sta = self.building_line
@@ -299,11 +217,38 @@ class TrainspottingAppUI:
 
         self.game.selection = sel
         if not self.game.selection:
-            self.game.selection = self.find_track_at(event.x, event.y)
+            self.game.selection = self.find_track_at(x, y)
         self.selection_changed()
 
     def handle_mouse_motion(self, event):
-        self.cursor_pos = event.x,event.y
+        self.cursor_pos = self.camera.to_world(event.x, event.y)
+
+    def handle_zoom(self, event):
+        """
+        Zooms the playing field around the cursor with the mouse wheel
+        :param event: mouse wheel event (delta on windows/mac, button 4/5 on x11)
+        :return: None
+        """
+        zoom_in = event.delta > 0 if event.num not in (4, 5) else event.num == 4
+        factor = Constants.CAMERA_ZOOM_STEP if zoom_in else 1 / Constants.CAMERA_ZOOM_STEP
+        self.camera.zoom_at(event.x, event.y, factor)
+
+    def handle_pan_start(self, event):
+        self.pan_start = event.x, event.y
+
+    def handle_pan(self, event):
+        """
+        Drags the playing field while the right mouse button is held
+        :param event: mouse event
+        :return: None
+        """
+        if self.pan_start is None:
+            return
+        self.camera.pan(event.x - self.pan_start[0], event.y - self.pan_start[1])
+        self.pan_start = event.x, event.y
+
+    def handle_resize(self, event):
+        self.camera.resize(event.width, event.height)
 
     def selection_changed(self):
         """
@@ -318,11 +263,6 @@ class TrainspottingAppUI:
             item.destroy()
         self.buttons.clear()
 
-        # Clear highlighted line
-        for item in self.game_entities:
-            if "highlight" in self.canvas.gettags(item):
-                self.canvas.delete(item)
-
         if not sel:
             return
 
@@ -350,9 +290,20 @@ class TrainspottingAppUI:
 
         self.master.destroy()
 
+    def is_closed(self):
+        """
+        Checks if the window was destroyed
+        :return: bool
+        """
+        try:
+            return not self.master.winfo_exists()
+        except tk.TclError:
+            return True
+
     def show_game_over_screen(self):
         self.game_over_screen_shown = True
         self.selection_changed()  # clear UI
+        self.renderer.clear()
         for item in self.game_entities:
             self.canvas.delete(item)
         self.game_entities.clear()
@@ -365,7 +316,7 @@ class TrainspottingAppUI:
             stipple="gray75"
         )
         self.game_entities.append(loss_cube)
-        daisy = self.canvas.create_image(400,400,image = self.daisy_image)
+        daisy = self.canvas.create_image(400,400,image = self.sprites.get(Constants.DAISY_PATH, 2))
         self.game_entities.append(daisy)
         loss_text = self.canvas.create_text(
             (Constants.UI_WIDTH - Constants.UI_SIDEBAR_MARGIN) // 2, Constants.UI_HEIGHT // 2 - 100,
@@ -436,7 +387,17 @@ class TrainspottingAppUI:
         )
         self.game_entities.append(title_text)
 
-        scores = self.game.scoreboard.get_scores()
+        scoreboard = self.game.scoreboard
+        rank_text = self.canvas.create_text(
+            (Constants.UI_WIDTH - Constants.UI_SIDEBAR_MARGIN) // 2, 110,
+            text=f"Your score {self.game.score} ranks #{scoreboard.rank(self.game.score)} of {len(scoreboard)} games",
+            anchor="n",
+            font=("Arial", 14),
+            fill="gray"
+        )
+        self.game_entities.append(rank_text)
+
+        scores = scoreboard.get_scores()
         y_pos = 150
         for i, entry in enumerate(scores):
             score_text = f"{i + 1}. {entry['name']}: {entry['score']}"
@@ -461,12 +422,13 @@ class TrainspottingAppUI:
 
 
 
-def create_ui(game):
+def create_ui(game, sprites=None):
     """
     Creates a UI class
     :param game: main game
+    :param sprites: SpriteCache - optional, see TrainspottingAppUI
     :return: AppUI
     """
     root = tk.Tk()
-    app = TrainspottingAppUI(root, game)
+    app = TrainspottingAppUI(root, game, sprites)
     return app
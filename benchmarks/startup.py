@@ -0,0 +1,67 @@
+"""
+Benchmark for the startup of the game
+Reports the import time and the time to the first tick for the headless and the GUI entry point,
+each measured in a fresh interpreter, and lists the optional heavy modules that got imported on the way
+The GUI entry point needs a display and is skipped without one
+Run from the repository root: python benchmarks/startup.py [runs]
+"""
+import os
+import sys
+import time
+import subprocess
+
+START = time.perf_counter()
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+ENTRY_POINTS = ("headless", "gui")
+HEAVY_MODULES = ("tkinter", "asyncio", "winsound", "numpy", "json", "scoreboard")
+
+
+def first_tick(entry_point):
+    """
+    Imports the entry point and runs the first tick (and frame for the GUI) of a new game
+    :param entry_point: str - one of ENTRY_POINTS
+    :return: tuple[float, float, list[str]] - import and first tick time in seconds since process start,
+             heavy modules that were imported
+    """
+    import maingame
+    if entry_point == "gui":
+        import UI
+    imported = time.perf_counter() - START
+
+    game = maingame.Game()
+    if entry_point == "gui":
+        ui = UI.create_ui(game)
+    game.tick()
+    if entry_point == "gui":
+        ui.present(0)
+    ticked = time.perf_counter() - START
+    if entry_point == "gui":
+        ui.master.destroy()
+    return imported, ticked, [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        imported, ticked, modules = first_tick(sys.argv[2])
+        print(imported, ticked, ",".join(modules) or "-")
+        sys.exit()
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print(f"{'entry':>8} {'import ms':>10} {'first tick ms':>14}  heavy modules")
+    for entry_point in ENTRY_POINTS:
+        results = []
+        for _ in range(runs):
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", entry_point],
+                                   capture_output=True, text=True)
+            if child.returncode != 0:
+                break
+            imported, ticked, modules = child.stdout.split()
+            results.append((float(imported) * 1000, float(ticked) * 1000))
+        if not results:
+            print(f"{entry_point:>8} failed: {child.stderr.strip().splitlines()[-1]}")
+            continue
+        imported = sum(r[0] for r in results) / len(results)
+        ticked = sum(r[1] for r in results) / len(results)
+        print(f"{entry_point:>8} {imported:>10.1f} {ticked:>14.1f}  {modules}")
@@ -0,0 +1,47 @@
+"""
+Benchmark for the worst-case tick time of the simulation core
+Runs headless games with many stations and reports mean, 99th percentile and maximum tick time
+The garbage collector is paused while measuring, so its pauses do not hide the spikes of the game logic
+Run from the repository root: python benchmarks/tick_spikes.py [stations ...]
+"""
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import Constants
+from maingame import Game
+
+PERIODS = 4
+
+
+def measure(stations):
+    """
+    Ticks a game with the given number of stations over a few cargo spawn periods
+    :param stations: int - number of stations on the field
+    :return: tuple[float, float, float] - mean, p99 and max tick time in microseconds
+    """
+    game = Game(seed=1)
+    while len(game.stations) < stations:
+        game.spawn_station()
+
+    times = []
+    gc.collect()
+    gc.disable()
+    for _ in range(PERIODS * Constants.CARGO_SPAWN_TICK_DELAY):
+        start = time.perf_counter()
+        game.tick()
+        times.append((time.perf_counter() - start) * 1e6)
+    gc.enable()
+    times.sort()
+    return sum(times) / len(times), times[int(len(times) * 0.99)], times[-1]
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 5000]
+    print(f"{'stations':>8} {'mean us':>10} {'p99 us':>10} {'max us':>10}")
+    for count in counts:
+        mean, p99, worst = measure(count)
+        print(f"{count:>8} {mean:>10.1f} {p99:>10.1f} {worst:>10.1f}")
@@ -0,0 +1,64 @@
+"""
+Benchmark for the train movement stage
+Compares the per-train python update with the vectorized TrainBatch on maps with many trains
+Run from the repository root: python benchmarks/train_movement.py [trains ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import Constants
+from maingame import Game
+from Line import Line
+from Train import Train
+
+TICKS = Constants.STATION_SPAWN_TICK_DELAY - 1  # the measured ticks end before the next station spawn
+TRAINS_PER_LINE = 10
+STATIONS_PER_LINE = 6
+
+
+def build_game(trains, batch_movement):
+    """
+    Creates a game with enough lines to hold the given number of trains
+    :param trains: int - number of trains
+    :param batch_movement: bool - use the vectorized movement stage
+    :return: Game
+    """
+    game = Game(batch_movement=batch_movement, seed=1)
+    game.lines.clear()
+    for line_id in range((trains + TRAINS_PER_LINE - 1) // TRAINS_PER_LINE):
+        line = Line(line_id, Constants.LINE_COLOR[line_id % len(Constants.LINE_COLOR)], game.versions)
+        game.lines.append(line)
+        for _ in range(STATIONS_PER_LINE):
+            game.spawn_station()
+            line.add_station(game.stations[-1])
+        for i in range(min(TRAINS_PER_LINE, trains - line_id * TRAINS_PER_LINE)):
+            line.trains.append(Train(line, line.stations[i % STATIONS_PER_LINE], game.cargo_delivered))
+    if game.train_batch is not None:
+        game.train_batch.trains_changed()
+    # no cargo and no station spawns during the measurement, so a tick is train movement only
+    game.spawn_schedule.buckets.clear()
+    game.tick_counter = 1
+    return game
+
+
+def measure(trains, batch_movement):
+    """
+    Runs TICKS ticks and returns the mean tick time in microseconds
+    """
+    game = build_game(trains, batch_movement)
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        game.tick()
+    return (time.perf_counter() - start) / TICKS * 1e6
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [10, 100, 300, 1000]
+    print(f"{'trains':>8} {'python us/tick':>16} {'batched us/tick':>16} {'speedup':>8}")
+    for count in counts:
+        scalar = measure(count, False)
+        batched = measure(count, True)
+        print(f"{count:>8} {scalar:>16.1f} {batched:>16.1f} {scalar / batched:>8.2f}")
@@ -0,0 +1,86 @@
+"""
+Benchmark for the cold start of the window, from process start to the first painted frame
+Every variant runs in a fresh interpreter:
+  eager - decodes every full size image at startup and subsamples it (the loading before the sprite cache)
+  cold  - sprite cache with an empty cache directory, the used sprites are built and stored
+  warm  - sprite cache with the variants from the previous run
+The eager variant is the startup of the commit before the sprite cache, so eager vs warm is the before/after number.
+Needs a display, without one it restarts itself under xvfb-run if that is installed.
+Run from the repository root: python benchmarks/ui_startup.py [runs]
+"""
+import os
+import sys
+import time
+import shutil
+import subprocess
+
+START = time.perf_counter()
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_ROOT)
+
+CACHE_DIR = os.path.join(".sprite_cache", "benchmark")
+VARIANTS = ("eager", "cold", "warm")
+
+
+def load_eagerly(sprites):
+    """
+    Loads all images the way the UI did before the sprite cache: decode full size, keep every subsampled variant
+    :param sprites: SpriteCache - in-memory cache the variants are stored in
+    :return: None
+    """
+    import tkinter as tk
+    import Constants
+    for image_path in Constants.CARGO_TYPE_TO_IMAGE.values():
+        image = tk.PhotoImage(file=image_path)
+        sprites.sprites[image_path, 24] = image.subsample(24)
+        sprites.sprites[image_path, 32] = image.subsample(32)
+    for image_path in [Constants.TRAIN_IMAGE, *Constants.LINE_COLOR_TO_TRAIN_IMAGE.values()]:
+        sprites.sprites[image_path, 6] = tk.PhotoImage(file=image_path).subsample(6)
+    sprites.sprites[Constants.DAISY_PATH, 2] = tk.PhotoImage(file=Constants.DAISY_PATH).subsample(2)
+
+
+def first_frame(variant):
+    """
+    Opens the window with a fresh game and paints the first frame
+    :param variant: str - one of VARIANTS
+    :return: float - seconds since process start
+    """
+    import tkinter as tk
+    from maingame import Game
+    from Assets import SpriteCache
+    from UI import TrainspottingAppUI
+
+    game = Game(seed=1)
+    root = tk.Tk()
+    sprites = SpriteCache(None if variant == "eager" else CACHE_DIR)
+    if variant == "eager":
+        load_eagerly(sprites)
+    ui = TrainspottingAppUI(root, game, sprites)
+    ui.present(0)
+    elapsed = time.perf_counter() - START
+    ui.master.destroy()
+    return elapsed
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        print(first_frame(sys.argv[2]))
+        sys.exit()
+
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        if shutil.which("xvfb-run") is None:
+            sys.exit("no display and no xvfb-run found, install Xvfb or run on a desktop")
+        os.execvp("xvfb-run", ["xvfb-run", "-a", sys.executable, *sys.argv])
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'variant':>8} {'mean ms':>10} {'min ms':>10}")
+    for variant in VARIANTS:
+        times = []
+        for _ in range(runs):
+            if variant == "cold":
+                shutil.rmtree(CACHE_DIR, ignore_errors=True)
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", variant],
+                                    capture_output=True, text=True, check=True).stdout
+            times.append(float(output) * 1000)
+        print(f"{variant:>8} {sum(times) / len(times):>10.1f} {min(times):>10.1f}")
@@ -1,45 +1,104 @@
 import time
-import asyncio
-from random import randint, choice
-import winsound
+import heapq
+import random
 
 import Constants
-from Constants import CHOO_CHOO_SOUND
-import UI
+from Spawner import CargoSpawner, SpawnSchedule
+from SpatialIndex import StationGrid, TrackIndex
+from LayerVersions import LayerVersions
 from Line import Line
-from Cargo import Cargo
+from Cargo import Cargo, CargoRegistry
 from Station import Station
 from Train import Train
-from scoreboard import Scoreboard
 
 
 class Game:
     """
     Main Game handling all game objects and managing their ticks. Progressed by game loop
     """
-    def __init__(self):
+    def __init__(self, batch_movement=False, initial_stations=True, seed=None):
         """
         Sets up everything needed to start the game logic
+        :param batch_movement: bool - move all trains in one vectorized step (requires numpy)
+        :param initial_stations: bool - place the first stations, disabled when a save game is loaded
+        :param seed: int - seed of the random generator, every random decision of the game depends only on it.
+            A random seed is drawn when None
         :return: None
         """
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        self.versions = LayerVersions()
         self.stations: list['Station'] = []
-        self.cargos: list['Cargo'] = []
+        self.cargo_spawner = CargoSpawner(self.rng)
+        self.spawn_schedule = SpawnSchedule(Constants.CARGO_SPAWN_TICK_DELAY)
+        self.station_grid = StationGrid()
+        self.cargos = CargoRegistry()
+        self.cargo_deadlines: list[tuple[int, int, 'Cargo']] = []  # min-heap of (expiry tick, handle, cargo)
         self.lines: list['Line'] = []
         self.trains: list['Train'] = []
         for i in range(Constants.MAX_LINES):
-            self.lines.append(Line(i, Constants.LINE_COLOR[i]))
+            self.lines.append(Line(i, Constants.LINE_COLOR[i], self.versions))
+        self.track_index = TrackIndex(self.lines)
         self.possible_types = [0, 1, 2]
         self.available_stations = [0, 1]
         self.money: int = Constants.STARTING_CAPITAL
         self.score = 0
+        self.deliveries = [0] * len(self.possible_types)  # delivered cargo per type, grows with the types in use
         self.running = True
         self.tick_counter = 1001
         self.last_time = time.perf_counter()
         self.selection = None
         self.game_over = False
-        self.scoreboard = Scoreboard()
+        self.speed = 1  # fast-forward multiplier used by the game loop
+        self._scoreboard = None  # read from disk on first use
+        self.listeners = []  # callables listener(event, data), notified about game events
+        self.train_batch = None
+        if batch_movement:
+            from TrainBatch import TrainBatch
+            self.train_batch = TrainBatch(self.lines)
+
+        if initial_stations:
+            self.generate_initial_stations()
+
+    @property
+    def selection(self):
+        """
+        Currently selected station or (line, track index) tuple, None if nothing is selected
+        """
+        return self._selection
+
+    @selection.setter
+    def selection(self, value):
+        self._selection = value
+        self.versions.semi_static += 1
+
+    @property
+    def scoreboard(self):
+        """
+        Scoreboard of all games, only loaded when the scores are needed (after a game loss)
+        """
+        if self._scoreboard is None:
+            from scoreboard import Scoreboard
+            self._scoreboard = Scoreboard()
+        return self._scoreboard
+
+    def add_listener(self, listener):
+        """
+        Registers a callable to be notified about game events, e.g. the audio service
+        :param listener: callable(event: str, data: dict)
+        :return: None
+        """
+        self.listeners.append(listener)
 
-        self.generate_initial_stations()
+    def emit(self, event, **data):
+        """
+        Notifies all listeners about a game event
+        :param event: str - name of the event, e.g. "train_bought"
+        :param data: details of the event
+        :return: None
+        """
+        for listener in self.listeners:
+            listener(event, data)
 
     def add_player_score(self, name):
         self.scoreboard.add_score(name, self.score)
@@ -50,10 +109,9 @@ class Game:
         :return:
         """
         for i in range(len(self.possible_types) - 1):
-            x = randint(0 + Constants.EDGE_MARGIN, Constants.FIELD_WIDTH - Constants.EDGE_MARGIN)
-            y = randint(0 + Constants.EDGE_MARGIN, Constants.FIELD_HEIGHT - Constants.EDGE_MARGIN)
+            x, y = self.find_station_position()
             c_type = i
-            self.stations.append(Station(x, y, c_type))
+            self.add_station(Station(x, y, c_type, self.versions))
 
 
     def spawn_station(self):
@@ -61,34 +119,74 @@ class Game:
         Creates a new station at a random position with pseudo-random cargo-type
         :return:
         """
-        x_pos = randint(0 + Constants.EDGE_MARGIN, Constants.FIELD_WIDTH - Constants.EDGE_MARGIN)
-        y_pos = randint(0 + Constants.EDGE_MARGIN, Constants.FIELD_HEIGHT - Constants.EDGE_MARGIN)
-        c_type = choice(self.possible_types)
+        x_pos, y_pos = self.find_station_position()
+        c_type = self.rng.choice(self.possible_types)
 
-        self.stations.append(Station(x_pos, y_pos, c_type))
+        self.add_station(Station(x_pos, y_pos, c_type, self.versions))
         if not c_type in self.available_stations:
             self.available_stations.append(c_type)
 
 
-    def spawn_cargo(self):
+    def find_station_position(self):
+        """
+        Draws random positions until one keeps STATION_MIN_DISTANCE to all other stations
+        (rejection sampling on the station grid). If the field is too full for that,
+        the candidate farthest from its nearest station is used.
+        :return: tuple[int, int] - x, y position for a new station
+        """
+        best = None
+        best_distance = -1
+        for _ in range(Constants.STATION_PLACEMENT_ATTEMPTS):
+            x = self.rng.randint(0 + Constants.EDGE_MARGIN, Constants.FIELD_WIDTH - Constants.EDGE_MARGIN)
+            y = self.rng.randint(0 + Constants.EDGE_MARGIN, Constants.FIELD_HEIGHT - Constants.EDGE_MARGIN)
+            distance = self.station_grid.nearest_distance(x, y, Constants.STATION_MIN_DISTANCE)
+            if distance >= Constants.STATION_MIN_DISTANCE:
+                return x, y
+            if distance > best_distance:
+                best = (x, y)
+                best_distance = distance
+        return best
+
+    def add_station(self, station):
+        """
+        Puts a new station on the field and registers it with spawner, spawn schedule and station grid
+        :param station: Station - newly created station
+        :return: None
+        """
+        station.id = len(self.stations)
+        self.stations.append(station)
+        self.cargo_spawner.add_station(station)
+        self.spawn_schedule.add_station(station)
+        self.station_grid.add(station)
+        self.versions.static += 1
+
+    def spawn_cargo(self, stations=None):
         """
         Creates a new random cargo object (every x ticks at every station)
         increases chance for spawning cargo type for each station with the same type
+        :param stations: list[Station] - stations to spawn at, all stations when None
         :return: None
         """
-        for sta in self.stations:
-            lst = [c.cargo_type for c in self.stations if c.cargo_type != sta.cargo_type]
-            c = Cargo(choice(lst),sta,self.game_loss,self.unlist_cargo)
-            sta.cargo_load.append(c)
-            self.cargos.append(c)
-
-    def unlist_cargo(self, cargo):
+        for sta in self.stations if stations is None else stations:
+            cargo_type = self.cargo_spawner.sample(sta.cargo_type)
+            if cargo_type is None:
+                continue  # no station could accept this cargo
+            c = Cargo(cargo_type, sta, self.tick_counter)
+            sta.add_cargo(c)
+            handle = self.cargos.add(c)
+            heapq.heappush(self.cargo_deadlines, (c.expiry_tick, handle, c))
+
+    def check_cargo_deadlines(self):
         """
-        Disables the loss condition of given cargo when it is deployed, called by Cargo class
-        :param cargo: Cargo - element to remove from tracking list
+        Triggers the loss condition if the oldest undelivered cargo timed out.
+        Only looks at the earliest deadline, delivered (unlisted) cargo is popped from the heap on the way.
         :return: None
         """
-        self.cargos.remove(cargo)
+        deadlines = self.cargo_deadlines
+        while deadlines and deadlines[0][2].delivered:
+            heapq.heappop(deadlines)
+        if deadlines and deadlines[0][0] <= self.tick_counter:
+            self.game_loss()
 
     def game_loss(self):
         """
@@ -104,20 +202,31 @@ class Game:
         :return: None
         """
         self.score += 1
+        if cargo_type >= len(self.deliveries):
+            self.deliveries.extend([0] * (cargo_type + 1 - len(self.deliveries)))
+        self.deliveries[cargo_type] += 1
         self.money += Constants.CARGO_VALUE.get(cargo_type, 0)
 
 
     def get_clicked_station(self, x, y):
         """
-        Returns the first station that touches the given coordinates
+        Returns the closest station that touches the given coordinates
         :param x: x Position
         :param y: y Position
         :return: Station
         """
-        for station in self.stations:
-            if station.is_clicked(x, y):
-                return station
-        return None
+        return self.station_grid.query_point(x, y)
+
+
+    def get_track_at(self, x, y, tolerance=Constants.TRACK_PICK_TOLERANCE):
+        """
+        Returns the track closest to the given coordinates
+        :param x: x Position
+        :param y: y Position
+        :param tolerance: float - maximal distance to the track
+        :return: Tuple['Line','int'] - Line that owns the track and its index, None if there is none
+        """
+        return self.track_index.nearest(x, y, tolerance)
 
 
     def get_available_lines(self, sta):
@@ -139,10 +248,12 @@ class Game:
         # For simplicity, only allow one train per line for now
         if len(line.trains) <= Constants.MAX_TRAINS_PER_LINE and self.money >= Constants.COST_PER_TRAIN:
             self.money -= Constants.COST_PER_TRAIN
-            winsound.PlaySound(CHOO_CHOO_SOUND, winsound.SND_ASYNC)
             train = Train(line, station, self.cargo_delivered)
             train.wait_timer = Constants.CARGO_DEPLOY_TIME * Constants.CARGO_SPOTS_PER_TROLLEY
             line.trains.append(train)
+            if self.train_batch is not None:
+                self.train_batch.trains_changed()
+            self.emit("train_bought", line=line, station=station, train=train)
     
     def buy_line(self, line, start_station, end_station):
         line_cost = Constants.COST_PER_LINE
@@ -156,22 +267,45 @@ class Game:
                 len(line.tracks) == 0 or
                 start_station == line.stations[0]
             )
+            self.emit("line_bought", line=line, start_station=start_station, end_station=end_station)
+
+    def demolish_track(self, line, track):
+        """
+        Removes a track from the end of a line or opens a loop at the track
+        :param line: Line - owner of the track
+        :param track: int - index of the track in line.tracks
+        :return: None
+        """
+        if line.can_delete_track(track):
+            line.demolish_track(track)
+            self.emit("track_demolished", line=line, track=track)
+
+    def sync_trains(self):
+        """
+        Writes the state of batched train movement back into the train objects, no-op without batching
+        :return: None
+        """
+        if self.train_batch is not None:
+            self.train_batch.sync_all()
 
     def tick(self):
         """
         Handles all logic that needs to be called continuously to update the game state
         :return: None
         """
-        self.trains = []
-        for l in self.lines:
-            l.tick(self.tick_counter)
-            self.trains.extend(l.trains)
-        for c in self.cargos:
-            c.tick()
+        if self.train_batch is not None:
+            self.train_batch.tick(self.tick_counter)
+            self.trains = self.train_batch.trains
+        else:
+            self.trains = []
+            for l in self.lines:
+                l.tick(self.tick_counter)
+                self.trains.extend(l.trains)
+        self.check_cargo_deadlines()
         if self.tick_counter % Constants.STATION_SPAWN_TICK_DELAY == 0:
             self.spawn_station()
-        if self.tick_counter % Constants.CARGO_SPAWN_TICK_DELAY == 0:
-            self.spawn_cargo()
+        # every station spawns once per CARGO_SPAWN_TICK_DELAY, staggered by its phase offset
+        self.spawn_cargo(self.spawn_schedule.due(self.tick_counter))
         if self.tick_counter % (1000 // Constants.MS_PER_TICK) == 0:
             pass # 1 second
 
@@ -179,53 +313,212 @@ class Game:
             self.possible_types.append(3)
 
         self.tick_counter += 1
+        self.versions.dynamic += 1
+
+
+class ConsolePresenter:
+    """
+    Presentation sink for headless runs, prints the game state to stdout
+    """
+    def __init__(self, game):
+        """
+        Constructor
+        :param game: Game - game instance to report on
+        """
+        self.game = game
+
+    def present(self, tps):
+        """
+        Prints a single status line
+        :param tps: float - ticks per second measured by the driver loop
+        :return: None
+        """
+        print(f"tick {self.game.tick_counter}  score {self.game.score}  "
+              f"money {self.game.money:.2f}  stations {len(self.game.stations)}  TPS {tps:.0f}")
+
+
+def headless_loop(game, max_ticks=None, presenter=None, present_interval=1.0):
+    """
+    Ticks the game logic as fast as the CPU allows, without rendering, sound or sleeping
+    :param game: Game - game instance to be ticked
+    :param max_ticks: int - number of ticks to run, runs until the game ends when None
+    :param presenter: presentation sink with a present(tps) method, called every present_interval seconds
+    :param present_interval: float - seconds between two presenter calls
+    :return: tuple[int, float] - ticks run and the average ticks per second
+    """
+    ticks = 0
+    start = time.perf_counter()
+    last_present = start
+    last_ticks = 0
+    while game.running and not game.game_over and (max_ticks is None or ticks < max_ticks):
+        game.tick()
+        ticks += 1
+
+        if presenter is not None:
+            now = time.perf_counter()
+            if now - last_present >= present_interval:
+                presenter.present((ticks - last_ticks) / (now - last_present))
+                last_present = now
+                last_ticks = ticks
 
+    elapsed = time.perf_counter() - start
+    return ticks, ticks / elapsed if elapsed > 0 else float("inf")
 
-async def game_loop(game, ui):
+
+async def game_loop(game, ui, autosave=None, recorder=None):
     """
-    Ticks the game logic, using the MS_PER_TICK constant. Runs faster when ticks take longer
-    :param ui: TrainspottingAppUI - UI App to be updated every tick
+    Ticks the game logic with a fixed timestep of MS_PER_TICK, independent of the rendering.
+    Elapsed real time (scaled by game.speed) is collected in an accumulator and paid out in whole ticks,
+    so several ticks run per frame when the repaint is slow. Frames are capped at MAX_FPS
+    and trains are interpolated between the last two ticks.
+    :param ui: TrainspottingAppUI - UI App to be presented every frame
     :param game: Game - game instance to be ticked
+    :param autosave: SnapshotWriter - saves the game every AUTOSAVE_TICKS while it is running, optional
+    :param recorder: SessionRecorder - takes the keyframes of the recorded session, optional
     :return: None
     """
-    old_time = 0
+    import asyncio
+    import tkinter as tk
 
-    interval = Constants.MS_PER_TICK / 1000.0
-    while game.running:
-        start = time.perf_counter()
+    tick_interval = Constants.MS_PER_TICK / 1000.0
+    frame_interval = 1.0 / Constants.MAX_FPS
+    accumulator = 0.0
+    previous = time.perf_counter()
 
-        # Call the game logic
-        game.tick()
+    tps = 0.0
+    tps_ticks = 0
+    tps_start = previous
+
+    while game.running:
+        frame_start = time.perf_counter()
+        accumulator += (frame_start - previous) * game.speed
+        previous = frame_start
+
+        # Call the game logic as often as the elapsed time demands
+        ticks = 0
+        while accumulator >= tick_interval and ticks < Constants.MAX_TICKS_PER_FRAME:
+            game.tick()
+            accumulator -= tick_interval
+            ticks += 1
+        if ticks == Constants.MAX_TICKS_PER_FRAME:
+            # Too far behind, drop the backlog instead of spiralling
+            accumulator = min(accumulator, tick_interval)
+
+        # Measure the real simulation rate
+        tps_ticks += ticks
+        if frame_start - tps_start >= 0.5:
+            tps = tps_ticks / (frame_start - tps_start)
+            tps_ticks = 0
+            tps_start = frame_start
+
+        # Keyframes are taken before the input of this frame is handled
+        if recorder is not None:
+            recorder.maybe_keyframe()
 
         # UI
         try:
-            ui.paint_field(old_time)
-            ui.master.update()
-        except Exception as ex:
-            print(ex)
+            ui.present(tps, accumulator / tick_interval)
+        except tk.TclError:
+            if not ui.is_closed():
+                raise
             break  # window was destroyed
 
-        # Compute how long the frame took
-        elapsed = time.perf_counter() - start
-        # Sleep the remaining time, if any
-        # print(interval,elapsed)
-        sleep_time = interval - elapsed
-        old_time = sleep_time * 1000
-        await asyncio.sleep(sleep_time)
+        if autosave is not None and not game.game_over:
+            autosave.maybe_save()
+
+        # Sleep the remaining frame time, if any
+        elapsed = time.perf_counter() - frame_start
+        await asyncio.sleep(max(frame_interval - elapsed, 0))
 
 
-async def main():
+def new_game(load_path=None):
+    """
+    Creates a new game, or loads it from a snapshot file
+    :param load_path: str - snapshot file, e.g. the autosave, None for a new game
+    :return: Game
+    """
+    if load_path is None:
+        return Game()
+    from Snapshot import load_game
+    return load_game(load_path)
+
+
+async def main(load_path=None):
     """
     Creates a UI object and starts the asynchronous game loop
+    :param load_path: str - snapshot file to continue, None for a new game
     :return: None
     """
-    g = Game()
+    import asyncio
+    import UI
+    from Audio import create_audio
+    from Snapshot import SnapshotWriter
+    from Replay import SessionRecorder
+
+    g = new_game(load_path)
+    audio = create_audio()
+    g.add_listener(audio.on_event)
+    recorder = SessionRecorder(g)
     ui = UI.create_ui(g)
-    await asyncio.create_task(game_loop(g, ui))
+    await asyncio.create_task(game_loop(g, ui, SnapshotWriter(g, Constants.AUTOSAVE_FILE), recorder))
+    audio.close()
+    recorder.save(Constants.REPLAY_FILE)
+
+
+def main_headless(max_ticks, quiet, load_path=None):
+    """
+    Runs a single game without any window or sound and reports the reached tick rate
+    :param max_ticks: int - number of ticks to run, runs until the game ends when None
+    :param quiet: bool - suppresses the periodic status lines
+    :param load_path: str - snapshot file to continue, None for a new game
+    :return: None
+    """
+    g = new_game(load_path)
+    presenter = None if quiet else ConsolePresenter(g)
+    ticks, tps = headless_loop(g, max_ticks, presenter)
+    print(f"{ticks} ticks, {tps:.0f} TPS, score {g.score}, game over: {g.game_over}")
+
+def main_replay(path, seek):
+    """
+    Re-simulates a recorded session without window and sound
+    :param path: str - replay file
+    :param seek: int - tick to stop at, the end of the recording when None
+    :return: None
+    """
+    from Replay import Replay
+
+    replay = Replay.load(path)
+    if seek is None:
+        g, tps = replay.play()
+        print(f"replayed to tick {g.tick_counter} at {tps:.0f} TPS, score {g.score}, game over: {g.game_over}")
+    else:
+        start = time.perf_counter()
+        g = replay.seek(seek)
+        print(f"seeked to tick {g.tick_counter} in {time.perf_counter() - start:.3f}s, "
+              f"score {g.score}, money {g.money:.2f}, game over: {g.game_over}")
 
 """
 Starting script
 """
 if __name__ == "__main__":
-    asyncio.run(main())
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Trainspotting")
+    parser.add_argument("--headless", action="store_true", help="run the simulation without window and sound")
+    parser.add_argument("--ticks", type=int, default=None, help="number of ticks to simulate in headless mode")
+    parser.add_argument("--quiet", action="store_true", help="only print the final result in headless mode")
+    parser.add_argument("--load", metavar="PATH", default=None,
+                        help=f"continue a saved game, e.g. the autosave {Constants.AUTOSAVE_FILE}")
+    parser.add_argument("--replay", metavar="PATH", default=None,
+                        help=f"re-simulate a recorded session, e.g. {Constants.REPLAY_FILE}")
+    parser.add_argument("--seek", type=int, default=None, help="tick to stop the replay at")
+    args = parser.parse_args()
+    if args.replay:
+        main_replay(args.replay, args.seek)
+    elif args.headless:
+        main_headless(args.ticks, args.quiet, args.load)
+    else:
+        import asyncio
+
+        asyncio.run(main(args.load))
 
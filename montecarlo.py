@@ -0,0 +1,239 @@
+"""
+Monte Carlo batch runner for balancing and stress tests
+Plays many headless games with scripted build strategies on a process pool, one seed and parameter set per game,
+and streams the results into a columnar results directory:
+    schema.json   - column names, array typecodes and the strategy names
+    <column>.bin  - raw little-endian values of one column, appended as results arrive
+Usage: montecarlo.py --games 100 --strategy chain --param TRAIN_SPEED=4,5,6 --param ELIMINATION_TIMER=1500,2000
+"""
+import os
+import sys
+import json
+import time
+import itertools
+from array import array
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import Constants
+from Strategies import STRATEGIES
+
+SCHEMA_FILE = "schema.json"
+
+
+def result_columns(param_names):
+    """
+    Columns of a results directory
+    :param param_names: list[str] - names of the swept constants
+    :return: list[tuple[str, str]] - (column name, array typecode)
+    """
+    return ([("seed", "q"), ("strategy", "B")] + [(name, "d") for name in param_names] +
+            [("ticks", "q"), ("score", "q"), ("money", "d")] +
+            [(f"delivered_{name}", "q") for name in Constants.CARGO_TYPE_NAMES] +
+            [("game_over", "B"), ("elapsed", "d")])
+
+
+def run_game(seed, strategy, params, max_ticks=Constants.BATCH_MAX_TICKS):
+    """
+    Plays a single headless game with the given constants, restores the constants afterwards
+    :param seed: int - seed of the game
+    :param strategy: str - name of the build strategy
+    :param params: dict[str, float] - constants to override for this game
+    :param max_ticks: int - ticks after which the game is stopped if it was not lost
+    :return: tuple[Game, int, float] - final game, ticks survived and the seconds it took
+    """
+    from maingame import Game
+
+    previous = {name: getattr(Constants, name) for name in params}
+    for name, value in params.items():
+        setattr(Constants, name, value)
+    try:
+        start = time.perf_counter()
+        game = Game(seed=seed)
+        player = STRATEGIES[strategy](game)
+        start_tick = game.tick_counter
+        end_tick = start_tick + max_ticks
+        while not game.game_over and game.tick_counter < end_tick:
+            if game.tick_counter % Constants.STRATEGY_TICKS == 0:
+                player.act()
+            game.tick()
+        return game, game.tick_counter - start_tick, time.perf_counter() - start
+    finally:
+        for name, value in previous.items():
+            setattr(Constants, name, value)
+
+
+def run_job(job):
+    """
+    Worker entry point, plays one game and returns its result row
+    :param job: tuple - (seed, strategy, params, max_ticks)
+    :return: tuple - values in the order of result_columns, without strategy code and parameters
+    """
+    seed, strategy, params, max_ticks = job
+    game, ticks, elapsed = run_game(seed, strategy, params, max_ticks)
+    types = len(Constants.CARGO_TYPE_NAMES)
+    if len(game.deliveries) > types:
+        raise ValueError(f"cargo of {len(game.deliveries)} types delivered, the results hold {types} types")
+    deliveries = game.deliveries + [0] * (types - len(game.deliveries))
+    return (ticks, game.score, float(game.money), *deliveries, int(game.game_over), elapsed)
+
+
+class ResultWriter:
+    """
+    Appends result rows to the column files of a results directory
+    A directory can be extended by later runs with the same columns, rows cut short by a crash are dropped on reading
+    """
+    def __init__(self, directory, param_names):
+        """
+        Constructor
+        Creates the directory and its schema, or checks the schema of an existing one
+        :param directory: str - results directory
+        :param param_names: list[str] - names of the swept constants
+        """
+        self.directory = directory
+        self.columns = result_columns(param_names)
+        schema = {"columns": self.columns, "strategies": list(STRATEGIES)}
+        os.makedirs(directory, exist_ok=True)
+        schema_path = os.path.join(directory, SCHEMA_FILE)
+        if os.path.exists(schema_path):
+            with open(schema_path, "r") as f:
+                existing = json.load(f)
+            if [tuple(column) for column in existing["columns"]] != self.columns:
+                raise ValueError(f"{directory} holds results with different columns")
+        else:
+            with open(schema_path, "w") as f:
+                json.dump(schema, f)
+        self.files = [open(os.path.join(directory, f"{name}.bin"), "ab") for name, _ in self.columns]
+
+    def write(self, row):
+        """
+        Appends one result row
+        :param row: sequence - one value per column
+        :return: None
+        """
+        for f, (_, typecode), value in zip(self.files, self.columns, row):
+            data = array(typecode, [value])
+            if sys.byteorder != "little":
+                data.byteswap()
+            f.write(data.tobytes())
+
+    def flush(self):
+        for f in self.files:
+            f.flush()
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+
+def read_results(directory):
+    """
+    Reads a results directory
+    :param directory: str - results directory
+    :return: dict[str, array] - column name -> values, all columns cut to the same number of rows
+    """
+    with open(os.path.join(directory, SCHEMA_FILE), "r") as f:
+        schema = json.load(f)
+    columns = {}
+    for name, typecode in schema["columns"]:
+        values = array(typecode)
+        with open(os.path.join(directory, f"{name}.bin"), "rb") as f:
+            data = f.read()
+        values.frombytes(data[:len(data) - len(data) % values.itemsize])
+        if sys.byteorder != "little":
+            values.byteswap()
+        columns[name] = values
+    rows = min(len(values) for values in columns.values())
+    return {name: values[:rows] for name, values in columns.items()}
+
+
+def sweep(strategies, params, games, first_seed=0, max_ticks=Constants.BATCH_MAX_TICKS):
+    """
+    Creates the jobs for every combination of strategy and parameter values, each played with games seeds
+    :param strategies: list[str] - strategy names
+    :param params: dict[str, list[float]] - constant name -> values to try
+    :param games: int - seeds per combination
+    :param first_seed: int - seed of the first game
+    :param max_ticks: int - tick limit per game
+    :return: iterator of jobs for run_job
+    """
+    names = list(params)
+    for strategy in strategies:
+        for values in itertools.product(*(params[name] for name in names)):
+            for seed in range(first_seed, first_seed + games):
+                yield seed, strategy, dict(zip(names, values)), max_ticks
+
+
+def run_batch(jobs, writer, workers=None):
+    """
+    Plays the jobs on a process pool and writes each result as soon as it arrives
+    Only a few jobs per worker are submitted ahead, so arbitrarily long sweeps run in constant memory
+    :param jobs: iterable of jobs from sweep
+    :param writer: ResultWriter
+    :param workers: int - worker processes, one per core when None
+    :return: tuple[int, int, float, float] - games, ticks, wall clock seconds, summed seconds of all games
+    """
+    strategy_codes = {name: code for code, name in enumerate(STRATEGIES)}
+    games = ticks = 0
+    busy = 0.0
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as executor:
+        ahead = 4 * workers
+        jobs = iter(jobs)
+        pending = {}
+        while True:
+            for job in itertools.islice(jobs, ahead - len(pending)):
+                pending[executor.submit(run_job, job)] = job
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                seed, strategy, params, max_ticks = pending.pop(future)
+                result = future.result()
+                writer.write((seed, strategy_codes[strategy], *params.values(), *result))
+                games += 1
+                ticks += result[0]
+                busy += result[-1]
+            writer.flush()
+    return games, ticks, time.perf_counter() - start, busy
+
+
+def parse_param(text):
+    """
+    Parses a --param argument
+    :param text: str - NAME=v1,v2,...
+    :return: tuple[str, list[float]]
+    """
+    name, _, values = text.partition("=")
+    if not isinstance(getattr(Constants, name, None), (int, float)):
+        raise ValueError(f"{name} is not a numeric constant")
+    return name, [float(value) if "." in value else int(value) for value in values.split(",")]
+
+
+"""
+Starting script
+"""
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Trainspotting Monte Carlo runner")
+    parser.add_argument("--games", type=int, default=10, help="seeds per strategy and parameter combination")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--strategy", action="append", choices=list(STRATEGIES),
+                        help="build strategy, can be repeated (default: all)")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2",
+                        help="constant to sweep, can be repeated")
+    parser.add_argument("--ticks", type=int, default=Constants.BATCH_MAX_TICKS, help="tick limit per game")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--out", default="results", help="results directory")
+    args = parser.parse_args()
+
+    params = dict(parse_param(text) for text in args.param)
+    writer = ResultWriter(args.out, list(params))
+    try:
+        games, ticks, wall, busy = run_batch(
+            sweep(args.strategy or list(STRATEGIES), params, args.games, args.seed, args.ticks), writer, args.workers)
+    finally:
+        writer.close()
+    print(f"{games} games, {ticks} ticks in {wall:.1f}s: {ticks / wall:.0f} TPS total, "
+          f"{busy / wall:.1f} games running in parallel on average")
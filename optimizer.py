@@ -0,0 +1,280 @@
+"""
+Network layout optimizer
+Searches the arrangement of the lines and their trains for a fixed set of stations with an evolutionary strategy.
+Every candidate layout is built through Game.buy_line and Game.buy_train on a copy of the start position
+and scored by simulating it headless for a fixed horizon, candidates are evaluated on a process pool
+and scores of layouts seen before are taken from a cache.
+A layout holds one (stations, trains) pair per line, stations is the tuple of station ids along the line
+(a loop repeats its first station at the end) and trains the number of trains starting at its first station.
+Usage: optimizer.py --stations 6 --money 5000 --generations 30
+"""
+import json
+import time
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import Constants
+from Snapshot import snapshot_bytes, restore_game, load_game
+
+EMPTY_LINE = ((), 0)
+
+base_snapshot = None  # start position of the worker processes, set by init_worker
+
+
+def start_game(seed=None, stations=0, money=None, load_path=None):
+    """
+    Creates the start position the layouts are built on
+    :param seed: int - seed of a new game
+    :param stations: int - stations spawned in addition to the initial ones
+    :param money: int - starting money, STARTING_CAPITAL when None
+    :param load_path: str - snapshot file to start from instead of a new game
+    :return: Game
+    """
+    from maingame import Game
+
+    game = load_game(load_path) if load_path else Game(seed=seed)
+    for _ in range(stations):
+        game.spawn_station()
+    if money is not None:
+        game.money = money
+    return game
+
+
+def layout_cost(layout, stations):
+    """
+    Money needed to build a layout
+    :param layout: tuple - layout
+    :param stations: list[Station] - stations of the start position
+    :return: float
+    """
+    cost = 0
+    for path, trains in layout:
+        for a, b in zip(path, path[1:]):
+            cost += Constants.COST_PER_LINE + stations[a].get_distance_to(stations[b]) * Constants.COST_PER_METER
+        cost += trains * Constants.COST_PER_TRAIN
+    return cost
+
+
+def build_layout(game, layout):
+    """
+    Builds a layout on a game without lines
+    The first track of a line is bought backwards, because the first purchase puts its end station in front
+    :param game: Game
+    :param layout: tuple - layout
+    :return: None
+    """
+    for line, (path, trains) in zip(game.lines, layout):
+        if len(path) < 2:
+            continue
+        game.buy_line(line, game.stations[path[1]], game.stations[path[0]])
+        for a, b in zip(path[1:], path[2:]):
+            game.buy_line(line, game.stations[a], game.stations[b])
+        for _ in range(trains):
+            game.buy_train(line, game.stations[path[0]])
+
+
+def evaluate(snapshot, layout, horizon, samples):
+    """
+    Scores a layout by simulating it from the start position
+    :param snapshot: bytes - start position
+    :param layout: tuple - layout
+    :param horizon: int - ticks to simulate
+    :param samples: int - simulations with different cargo randomness, the first one uses the saved random state
+    :return: tuple[float, float, int] - mean score, mean ticks survived, simulated ticks
+    """
+    score = survived = 0
+    for sample in range(samples):
+        game = restore_game(snapshot)
+        if sample:
+            game.rng.seed(sample)
+        build_layout(game, layout)
+        start_tick = game.tick_counter
+        while not game.game_over and game.tick_counter - start_tick < horizon:
+            game.tick()
+        score += game.score
+        survived += game.tick_counter - start_tick
+    return score / samples, survived / samples, survived
+
+
+def init_worker(snapshot):
+    global base_snapshot
+    base_snapshot = snapshot
+
+
+def evaluate_job(job):
+    """
+    Worker entry point
+    :param job: tuple - (layout, horizon, samples)
+    :return: tuple[float, float, int, float] - evaluate result and the seconds it took
+    """
+    start = time.perf_counter()
+    return (*evaluate(base_snapshot, *job), time.perf_counter() - start)
+
+
+class LayoutOptimizer:
+    """
+    (mu + lambda) evolution over layouts: every generation mutates randomly chosen layouts of the population,
+    evaluates the new ones in parallel and keeps the best population_size layouts seen.
+    """
+    def __init__(self, game, horizon=Constants.OPTIMIZER_HORIZON, samples=1,
+                 population_size=Constants.OPTIMIZER_POPULATION, offspring=Constants.OPTIMIZER_OFFSPRING, seed=None):
+        """
+        Constructor
+        :param game: Game - start position, without lines
+        :param horizon: int - ticks simulated per evaluation
+        :param samples: int - simulations per evaluation
+        :param population_size: int - layouts kept between generations
+        :param offspring: int - mutated layouts per generation
+        :param seed: int - seed of the search
+        """
+        self.stations = game.stations
+        self.money = game.money
+        self.snapshot = snapshot_bytes(game)
+        self.horizon = horizon
+        self.samples = samples
+        self.population_size = population_size
+        self.offspring = offspring
+        self.rng = random.Random(seed)
+        self.cache: dict[tuple, tuple[float, float]] = {}  # layout -> (score, ticks survived)
+        self.population: list[tuple] = []
+        self.evaluations = 0
+        self.cache_hits = 0
+        self.ticks = 0
+        self.busy = 0.0  # summed worker seconds
+
+    def fitness(self, layout):
+        return self.cache[layout]
+
+    def mutate(self, layout):
+        """
+        Changes one line of a layout at random, repeated until the layout is affordable
+        :param layout: tuple - parent layout
+        :return: tuple - child layout, the parent if no affordable mutation was found
+        """
+        for _ in range(20):
+            lines = list(layout)
+            index = self.rng.randrange(len(lines))
+            path, trains = lines[index]
+            loop = len(path) > 2 and path[0] == path[-1]
+            stops = list(path[:-1] if loop else path)
+            others = [station.id for station in self.stations if station.id not in stops]
+            move = self.rng.randrange(5)
+            if move == 0 and len(others) >= 2 - len(stops):  # add a station at a random position
+                if not stops:
+                    stops = self.rng.sample(others, 2)  # an unused line starts with a track
+                else:
+                    stops.insert(self.rng.randint(0, len(stops)), self.rng.choice(others))
+            elif move == 1 and stops:  # remove a station
+                stops.pop(self.rng.randrange(len(stops)))
+            elif move == 2 and len(stops) >= 2:  # swap two neighbours
+                i = self.rng.randrange(len(stops) - 1)
+                stops[i], stops[i + 1] = stops[i + 1], stops[i]
+            elif move == 3 and len(stops) >= 3:  # open or close the loop
+                loop = not loop
+            elif move == 4:  # buy or sell a train
+                trains = max(0, min(Constants.MAX_TRAINS_PER_LINE + 1, trains + self.rng.choice((-1, 1))))
+            else:
+                continue
+            if len(stops) < 2:
+                lines[index] = EMPTY_LINE
+            else:
+                loop = loop and len(stops) >= 3
+                lines[index] = (tuple(stops + stops[:1] if loop else stops), trains)
+            child = tuple(lines)
+            if child != layout and layout_cost(child, self.stations) <= self.money:
+                return child
+        return layout
+
+    def evaluate_all(self, executor, layouts):
+        """
+        Evaluates the layouts missing in the cache on the process pool
+        :param executor: ProcessPoolExecutor
+        :param layouts: list[tuple]
+        :return: None
+        """
+        new = list(dict.fromkeys(layout for layout in layouts if layout not in self.cache))
+        self.cache_hits += len(layouts) - len(new)
+        jobs = [(layout, self.horizon, self.samples) for layout in new]
+        for layout, (score, survived, ticks, elapsed) in zip(new, executor.map(evaluate_job, jobs)):
+            self.cache[layout] = (score, survived)
+            self.evaluations += 1
+            self.ticks += ticks
+            self.busy += elapsed
+
+    def run(self, generations=Constants.OPTIMIZER_GENERATIONS, workers=None, report=None):
+        """
+        Runs the search
+        :param generations: int - number of generations
+        :param workers: int - worker processes, one per core when None
+        :param report: callable report(generation, optimizer) called after every generation, or None
+        :return: tuple - best layout found
+        """
+        empty = tuple(EMPTY_LINE for _ in range(Constants.MAX_LINES))
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(self.snapshot,)) as executor:
+            layouts = [empty] + [self.mutate(empty) for _ in range(self.offspring)]
+            self.evaluate_all(executor, layouts)
+            self.population = sorted(set(layouts), key=self.fitness, reverse=True)[:self.population_size]
+            for generation in range(generations):
+                children = [self.mutate(self.rng.choice(self.population)) for _ in range(self.offspring)]
+                self.evaluate_all(executor, children)
+                self.population = sorted(set(self.population + children), key=self.fitness,
+                                         reverse=True)[:self.population_size]
+                if report is not None:
+                    report(generation, self)
+        return self.population[0]
+
+
+def describe(layout, optimizer):
+    """
+    Human readable summary of a layout
+    :return: str
+    """
+    rows = []
+    for color, (path, trains) in zip(Constants.LINE_COLOR, layout):
+        stops = " - ".join(f"{i}{optimizer.stations[i].position}" for i in path) or "unused"
+        rows.append(f"  {color}: {stops}, {trains} train(s)")
+    score, survived = optimizer.fitness(layout)
+    rows.append(f"  score {score:.1f}, survived {survived:.0f} of {optimizer.horizon} ticks, "
+                f"cost {layout_cost(layout, optimizer.stations):.0f} of {optimizer.money:.0f}")
+    return "\n".join(rows)
+
+
+"""
+Starting script
+"""
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Trainspotting network layout optimizer")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the game providing the stations")
+    parser.add_argument("--stations", type=int, default=4, help="stations spawned in addition to the initial ones")
+    parser.add_argument("--money", type=int, default=None, help="starting money")
+    parser.add_argument("--load", metavar="PATH", default=None, help="start from a saved game instead")
+    parser.add_argument("--horizon", type=int, default=Constants.OPTIMIZER_HORIZON, help="ticks per evaluation")
+    parser.add_argument("--samples", type=int, default=1, help="simulations per evaluation")
+    parser.add_argument("--generations", type=int, default=Constants.OPTIMIZER_GENERATIONS)
+    parser.add_argument("--population", type=int, default=Constants.OPTIMIZER_POPULATION)
+    parser.add_argument("--offspring", type=int, default=Constants.OPTIMIZER_OFFSPRING)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--out", default="best_layout.json", help="file receiving the best layout")
+    args = parser.parse_args()
+
+    game = start_game(args.seed, args.stations, args.money, args.load)
+    optimizer = LayoutOptimizer(game, args.horizon, args.samples, args.population, args.offspring, args.seed)
+
+    def report(generation, opt):
+        score, survived = opt.fitness(opt.population[0])
+        print(f"generation {generation + 1}: best score {score:.1f} ({survived:.0f} ticks), "
+              f"{opt.evaluations} layouts evaluated")
+
+    start = time.perf_counter()
+    best = optimizer.run(args.generations, args.workers, report)
+    wall = time.perf_counter() - start
+    print("best layout:")
+    print(describe(best, optimizer))
+    print(f"{optimizer.evaluations} evaluations ({optimizer.cache_hits} cache hits) in {wall:.1f}s: "
+          f"{optimizer.evaluations / wall:.1f} layouts/s, {optimizer.ticks / wall:.0f} TPS, "
+          f"{optimizer.busy / wall:.1f} workers busy on average")
+    with open(args.out, "w") as f:
+        json.dump({"seed": args.seed, "stations": args.stations, "money": optimizer.money, "load": args.load,
+                   "layout": best, "score": optimizer.fitness(best)[0]}, f)
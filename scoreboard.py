@@ -1,37 +1,249 @@
+import os
 import json
+import heapq
+from bisect import bisect_right
+
+SCOREBOARD_FILE = "scores.json"  # top 10 list of older versions, imported until the first compaction
+SNAPSHOT_FILE = "scores.snapshot"
+LOG_FILE = "scores.log"
+LOCK_FILE = "scores.lock"
+TOP_K = 100  # best entries kept with their names
+COMPACT_EVERY = 1000  # log entries after which the log is folded into the snapshot
+
+
+class FileLock:
+    """
+    Exclusive lock between processes on a lock file, used as context manager
+    """
+    def __init__(self, path):
+        """
+        Constructor
+        :param path: str - path of the lock file, created if missing
+        """
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        try:
+            import fcntl
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        except ImportError:
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(self.fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after 10 seconds, keep waiting
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            import fcntl
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        except ImportError:
+            import msvcrt
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        os.close(self.fd)
+        self.fd = None
 
-SCOREBOARD_FILE = "scores.json"
 
 class Scoreboard:
     """
-    Handles the user scores to be displayed after each game
+    Handles the user scores to be displayed after each game.
+    Every score is appended to a log, which is folded into an aggregate snapshot every COMPACT_EVERY entries.
+    The snapshot only holds the TOP_K best entries, the best score per player and the number of entries per score,
+    so loading it and answering rank queries does not depend on the total number of games played.
+    All file access is protected by a lock file, so several game processes can share one scoreboard.
+    Files are read on first use.
     """
-    def __init__(self):
-        self.scores = []
-        self.load_scores()
+    def __init__(self, directory="."):
+        """
+        Constructor
+        :param directory: str - directory holding the scoreboard files
+        """
+        self.directory = directory
+        self.loaded = False
+        self.generation = 0  # incremented by every compaction, names the current log file
+        self.log_offset = 0  # bytes of the current log already applied
+        self.log_entries = 0
+        self.count = 0
+        self.top: list[tuple[int, int, str]] = []  # min-heap of (score, -entry number, name)
+        self.best: dict[str, int] = {}  # player name -> best score
+        self.score_counts: dict[int, int] = {}  # score -> number of entries
+        self.sorted_scores: list[int] | None = []  # distinct scores ascending, None if outdated
 
-    def load_scores(self):
-        """Loads scores from the scoreboard file."""
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def log_path(self, generation):
+        return self.path(f"{LOG_FILE}.{generation}")
+
+    def lock(self):
+        return FileLock(self.path(LOCK_FILE))
+
+    def read_generation(self):
+        """
+        Reads the generation from the header line of the snapshot
+        :return: int - 0 if there is no snapshot yet
+        """
         try:
-            with open(SCOREBOARD_FILE, "r") as f:
-                self.scores = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.scores = []
+            with open(self.path(SNAPSHOT_FILE), "r") as f:
+                return json.loads(f.readline())["generation"]
+        except FileNotFoundError:
+            return 0
 
-    def save_scores(self):
-        """Saves scores to the scoreboard file."""
-        with open(SCOREBOARD_FILE, "w") as f:
-            json.dump(self.scores, f, indent=4)
+    def load_snapshot(self):
+        """
+        Replaces the in-memory state with the snapshot (or the scores of older versions if there is none)
+        Must be called with the lock held
+        :return: None
+        """
+        self.count = 0
+        self.top = []
+        self.best = {}
+        self.score_counts = {}
+        self.sorted_scores = None
+        self.log_offset = 0
+        self.log_entries = 0
+        try:
+            with open(self.path(SNAPSHOT_FILE), "r") as f:
+                header = json.loads(f.readline())
+                self.generation = header["generation"]
+                self.count = header["count"]
+                self.top = [(score, entry, name) for score, entry, name in json.loads(f.readline())]
+                heapq.heapify(self.top)
+                self.best = json.loads(f.readline())
+                self.score_counts = {score: count for score, count in json.loads(f.readline())}
+        except FileNotFoundError:
+            self.generation = 0
+            try:
+                with open(self.path(SCOREBOARD_FILE), "r") as f:
+                    for entry in json.load(f):
+                        self.apply(entry["name"], entry["score"])
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+
+    def refresh(self):
+        """
+        Applies log entries written since the last refresh, by this or any other process
+        Reloads the snapshot if another process compacted the log in the meantime
+        Must be called with the lock held
+        :return: None
+        """
+        generation = self.read_generation()
+        if not self.loaded or generation != self.generation:
+            self.load_snapshot()
+            self.loaded = True
+        try:
+            with open(self.log_path(self.generation), "rb") as f:
+                f.seek(self.log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        end = data.rfind(b"\n") + 1  # an unfinished last line is read on the next refresh
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # damaged by a crash during a write
+            self.apply(entry["name"], entry["score"])
+            self.log_entries += 1
+        self.log_offset += end
+
+    def apply(self, name, score):
+        """
+        Adds a single entry to the in-memory state
+        :return: None
+        """
+        self.count += 1
+        entry = (score, -self.count, name)  # on equal scores the earlier entry ranks higher
+        if len(self.top) < TOP_K:
+            heapq.heappush(self.top, entry)
+        elif entry > self.top[0]:
+            heapq.heapreplace(self.top, entry)
+        if score > self.best.get(name, score - 1):
+            self.best[name] = score
+        if score not in self.score_counts:
+            self.sorted_scores = None
+        self.score_counts[score] = self.score_counts.get(score, 0) + 1
+
+    def load_scores(self):
+        """Loads the scores on first use and applies scores added by other processes."""
+        with self.lock():
+            self.refresh()
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load_scores()
 
     def add_score(self, name, score):
-        """Adds a new score and saves it."""
-        self.scores.append({"name": name, "score": score})
-        # Sort scores descending
-        self.scores.sort(key=lambda x: x["score"], reverse=True)
-        # Keep top 10
-        self.scores = self.scores[:10]
-        self.save_scores()
-
-    def get_scores(self):
-        """Returns the sorted list of scores."""
-        return self.scores
+        """Appends a new score to the log and compacts the log when it got long."""
+        line = (json.dumps({"name": name, "score": score}) + "\n").encode()
+        with self.lock():
+            self.refresh()
+            fd = os.open(self.log_path(self.generation), os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self.refresh()
+            if self.log_entries >= COMPACT_EVERY:
+                self.compact()
+
+    def compact(self):
+        """
+        Writes the in-memory state as new snapshot and starts an empty log
+        Must be called with the lock held, right after a refresh
+        :return: None
+        """
+        old_log = self.log_path(self.generation)
+        self.generation += 1
+        temp_path = self.path(f"{SNAPSHOT_FILE}.{os.getpid()}.tmp")
+        with open(temp_path, "w") as f:
+            f.write(json.dumps({"generation": self.generation, "count": self.count}) + "\n")
+            f.write(json.dumps(self.top) + "\n")
+            f.write(json.dumps(self.best) + "\n")
+            f.write(json.dumps(sorted(self.score_counts.items())) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path(SNAPSHOT_FILE))
+        self.log_offset = 0
+        self.log_entries = 0
+        try:
+            os.remove(old_log)
+        except FileNotFoundError:
+            pass
+
+    def get_scores(self, count=10):
+        """Returns the best scores, sorted descending."""
+        self.ensure_loaded()
+        return [{"name": name, "score": score} for score, entry, name in heapq.nlargest(count, self.top)]
+
+    def rank(self, score):
+        """
+        Position the given score would take on the scoreboard
+        :param score: int
+        :return: int - 1 for a new best score
+        """
+        self.ensure_loaded()
+        if self.sorted_scores is None:
+            self.sorted_scores = sorted(self.score_counts)
+        higher = self.sorted_scores[bisect_right(self.sorted_scores, score):]
+        return 1 + sum(self.score_counts[s] for s in higher)
+
+    def get_best(self, name):
+        """
+        Best score of a player
+        :param name: str - player name
+        :return: int or None if the player has no score yet
+        """
+        self.ensure_loaded()
+        return self.best.get(name)
+
+    def __len__(self):
+        self.ensure_loaded()
+        return self.count